@@ -3,14 +3,32 @@ ASGI config for foodgram_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Запросы резолвятся по ASGI_URLCONF: горячие чтения обслуживают
+async-view, остальное — те же синхронные view, что и под WSGI.
+Запуск: gunicorn -k uvicorn.workers.UvicornWorker
+foodgram_backend.asgi:application
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodgram_backend.settings")
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+
+class AsyncRoutesHandler(ASGIHandler):
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = settings.ASGI_URLCONF
+        return request, error_response
+
+
+application = AsyncRoutesHandler()
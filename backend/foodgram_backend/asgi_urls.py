@@ -0,0 +1,28 @@
+# foodgram_backend/asgi_urls.py
+
+from django.urls import include, path
+
+from recipes import async_views
+
+# Под ASGI горячие чтения обслуживают async-view (recipes/async_views.py),
+# остальное — тот же ROOT_URLCONF. Имена маршрутов совпадают с роутером
+# DRF: reverse() и метки метрик одинаковы в обоих развёртываниях.
+urlpatterns = [
+    path("api/recipes/", async_views.recipe_list, name="recipe-list"),
+    path(
+        "api/recipes/<int:pk>/",
+        async_views.recipe_detail,
+        name="recipe-detail",
+    ),
+    path(
+        "api/recipes/<int:pk>/get-link/",
+        async_views.recipe_get_link,
+        name="recipe-get-link",
+    ),
+    path(
+        "api/ingredients/",
+        async_views.ingredient_list,
+        name="ingredient-list",
+    ),
+    path("", include("foodgram_backend.urls")),
+]
@@ -0,0 +1,483 @@
+"""
+Метрики в текстовом формате Prometheus без внешних сервисов.
+
+Каждый воркер gunicorn копит счётчики в памяти и не чаще раза в
+METRICS_FLUSH_INTERVAL секунд сбрасывает их в
+METRICS_DIR/<pid>-<время старта>.json; /api/metrics/ складывает файлы
+всех воркеров. Время старта в имени не даёт новому процессу с тем же
+pid затереть итоги завершившегося. При первом сбросе процесс
+переносит файлы завершившихся воркеров (и прошлых запусков) в общий
+dead.json — как mark_process_dead в multiprocess-режиме
+prometheus_client, — поэтому файлов не больше, чем живых воркеров, а
+счётчики не убывают. Метки — имя маршрута (recipe-list,
+recipe-download-shopping-cart, user-subscriptions, ...).
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+try:
+    import fcntl
+except ImportError:  # не POSIX: один процесс runserver, делить нечего
+    fcntl = None
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+UNRESOLVED = "unresolved"
+logger = logging.getLogger(__name__)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# итоги завершившихся воркеров и блокировка их переноса
+DEAD_WORKERS = "dead.json"
+LOCK = ".lock"
+
+# имя → (тип, описание); порядок задаёт порядок вывода
+METRICS = {
+    "foodgram_http_requests_total": (
+        "counter",
+        "Обработанные запросы",
+    ),
+    "foodgram_http_request_duration_seconds": (
+        "histogram",
+        "Время обработки запроса, включая отдачу потокового тела",
+    ),
+    "foodgram_http_response_bytes_total": (
+        "counter",
+        "Отданные байты тела ответа",
+    ),
+    "foodgram_db_queries_total": (
+        "counter",
+        "Выполненные SQL-запросы",
+    ),
+    "foodgram_db_query_duration_seconds_total": (
+        "counter",
+        "Суммарное время SQL-запросов",
+    ),
+}
+
+
+class Registry:
+    """Счётчики одного процесса с периодическим сбросом на диск."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # один писатель файла на процесс; счёт запросов его не ждёт
+        self.flush_lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.flushed_at = 0.0
+        # файл процесса: pid и время первого сброса в этом pid
+        self.pid = None
+        self.name = None
+
+    def observe(self, view, method, status, seconds, size, queries, sql):
+        labels = (view, method)
+        with self.lock:
+            for name, key, value in (
+                ("foodgram_http_requests_total", labels + (status,), 1),
+                ("foodgram_http_response_bytes_total", labels, size),
+                ("foodgram_db_queries_total", labels, queries),
+                ("foodgram_db_query_duration_seconds_total", labels, sql),
+            ):
+                self.counters[name, key] = (
+                    self.counters.get((name, key), 0) + value
+                )
+            # последние две ячейки — сумма и число наблюдений
+            histogram = self.histograms.setdefault(
+                labels, [0] * (len(LATENCY_BUCKETS) + 2)
+            )
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def due(self):
+        return (
+            time.monotonic() - self.flushed_at
+            >= settings.METRICS_FLUSH_INTERVAL
+        )
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [
+                    [name, list(key), value]
+                    for (name, key), value in self.counters.items()
+                ],
+                "histograms": [
+                    [list(key), values]
+                    for key, values in self.histograms.items()
+                ],
+            }
+
+    def flush(self):
+        with self.flush_lock:
+            self.write()
+
+    def flush_if_due(self):
+        """
+        Сброс по таймеру из обработки запроса: если файл уже пишет другой
+        поток — пропускаем, ошибка диска запрос не роняет.
+        """
+        if not self.due() or not self.flush_lock.acquire(blocking=False):
+            return
+        try:
+            self.write()
+        except OSError:
+            logger.exception("Не удалось сбросить метрики")
+        finally:
+            self.flush_lock.release()
+
+    def write(self):
+        """Атомарно переписывает файл своего процесса."""
+        self.flushed_at = time.monotonic()
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        pid = os.getpid()
+        if self.pid != pid:
+            # первый сброс процесса (в том числе после fork)
+            merge_dead_workers(directory, pid)
+            self.pid, self.name = pid, f"{pid}-{time.time_ns()}.json"
+        write_json(directory, self.name, self.snapshot())
+
+
+registry = Registry()
+
+
+async def aflush_if_due():
+    # запись файла — в пуле потоков, не в event loop
+    if registry.due():
+        await sync_to_async(registry.flush_if_due, thread_sensitive=False)()
+
+
+def write_json(directory, name, data):
+    # своё временное имя: .tmp не попадает в collect()
+    fd, tmp = tempfile.mkstemp(
+        dir=directory, prefix=f"{os.getpid()}.", suffix=".tmp"
+    )
+    try:
+        with open(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(tmp, os.path.join(directory, name))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def read_json(path):
+    """Снимок из файла; None, если файл удалён или переписывается."""
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def locked(directory, exclusive):
+    """Перенос файлов — под LOCK_EX, чтение collect() — под LOCK_SH."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, LOCK), "a") as file:
+        fcntl.flock(file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def worker_files(directory):
+    """(имя, pid) файлов воркеров в каталоге."""
+    for entry in os.scandir(directory):
+        pid = entry.name.split("-")[0].removesuffix(".json")
+        if entry.name.endswith(".json") and pid.isdigit():
+            yield entry.name, int(pid)
+
+
+def merge_dead_workers(directory, own_pid):
+    """
+    Переносит файлы завершившихся процессов в dead.json. Файл со своим
+    pid ещё до первого сброса — тоже чужой: pid достался от умершего.
+    Имена перенесённых файлов остаются в dead.json, пока файлы не
+    удалены, — иначе падение между записью и удалением учло бы их дважды.
+    """
+    if fcntl is None:
+        return
+    with locked(directory, exclusive=True):
+        path = os.path.join(directory, DEAD_WORKERS)
+        dead = read_json(path) or {"counters": [], "histograms": []}
+        merged = set(dead.get("merged", ()))
+        names = set()
+        counters, histograms = add({}, {}, dead)
+        for name, pid in worker_files(directory):
+            names.add(name)
+            if name in merged or (pid != own_pid and is_alive(pid)):
+                continue
+            snapshot = read_json(os.path.join(directory, name))
+            if snapshot is not None:
+                add(counters, histograms, snapshot)
+                merged.add(name)
+        merged &= names
+        if not merged:
+            return
+        write_json(
+            directory,
+            DEAD_WORKERS,
+            {
+                "counters": [
+                    [name, list(key), value]
+                    for (name, key), value in counters.items()
+                ],
+                "histograms": [
+                    [list(key), values] for key, values in histograms.items()
+                ],
+                "merged": sorted(merged),
+            },
+        )
+        for name in merged:
+            os.unlink(os.path.join(directory, name))
+
+
+def add(counters, histograms, snapshot):
+    for name, key, value in snapshot["counters"]:
+        counters[name, tuple(key)] = (
+            counters.get((name, tuple(key)), 0) + value
+        )
+    for key, values in snapshot["histograms"]:
+        total = histograms.setdefault(tuple(key), [0] * len(values))
+        for i, value in enumerate(values):
+            total[i] += value
+    return counters, histograms
+
+
+def collect():
+    """Складывает снимки всех воркеров, включая завершившиеся."""
+    counters, histograms = {}, {}
+    directory = settings.METRICS_DIR
+    with locked(directory, exclusive=False):
+        dead = read_json(os.path.join(directory, DEAD_WORKERS))
+        if dead is not None:
+            add(counters, histograms, dead)
+        merged = set(dead.get("merged", ())) if dead else set()
+        for name, _ in worker_files(directory):
+            if name in merged:
+                continue
+            # файл мог исчезнуть — возьмём на следующем опросе
+            snapshot = read_json(os.path.join(directory, name))
+            if snapshot is not None:
+                add(counters, histograms, snapshot)
+    return counters, histograms
+
+
+def format_labels(names, values):
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    )
+    return f"{{{pairs}}}"
+
+
+def render(counters, histograms):
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "histogram":
+            for labels, values in sorted(histograms.items()):
+                for bound, value in zip(
+                    LATENCY_BUCKETS + ("+Inf",), values[:-2] + values[-1:]
+                ):
+                    lines.append(
+                        f"{name}_bucket"
+                        + format_labels(
+                            ("view", "method", "le"), labels + (bound,)
+                        )
+                        + f" {value}"
+                    )
+                tags = format_labels(("view", "method"), labels)
+                lines.append(f"{name}_sum{tags} {values[-2]}")
+                lines.append(f"{name}_count{tags} {values[-1]}")
+            continue
+        names = ("view", "method", "status")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{format_labels(names, labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    registry.flush()
+    return HttpResponse(render(*collect()), content_type=CONTENT_TYPE)
+
+
+class QueryTimer:
+    """
+    Число и суммарное время SQL-запросов запроса.
+    Текущий таймер лежит в contextvar: под ASGI ORM работает в потоках
+    sync_to_async со своими соединениями, а контекст туда копируется.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def wrap(self):
+        for connection in connections.all(initialized_only=True):
+            install_timer(connection)
+        token = current_timer.set(self)
+        try:
+            yield self
+        finally:
+            current_timer.reset(token)
+
+
+current_timer = ContextVar("query_timer", default=None)
+
+
+def timed_execute(execute, sql, params, many, context):
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_timer(connection, **kwargs):
+    if timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, timed_execute)
+
+
+class MetricsMiddleware:
+    """
+    Снимает время, SQL и размер ответа по имени маршрута.
+    Потоковые ответы учитываются, когда тело дочитано: запросы
+    выгрузки выполняются уже при отдаче.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        timer = QueryTimer()
+        with timer.wrap():
+            response = self.get_response(request)
+        response = self.finish(request, response, timer, started)
+        registry.flush_if_due()
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        timer = QueryTimer()
+        with timer.wrap():
+            response = await self.get_response(request)
+        response = self.finish(request, response, timer, started)
+        await aflush_if_due()
+        return response
+
+    def finish(self, request, response, timer, started):
+        if not response.streaming:
+            self.record(
+                request, response, timer, started, len(response.content)
+            )
+        elif response.is_async:
+            response.streaming_content = self.astream(
+                request, response, response.streaming_content, timer, started
+            )
+        else:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content, timer, started
+            )
+        return response
+
+    def stream(self, request, response, content, timer, started):
+        size = 0
+        try:
+            with timer.wrap():
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.record(request, response, timer, started, size)
+            registry.flush_if_due()
+
+    async def astream(self, request, response, content, timer, started):
+        size = 0
+        try:
+            with timer.wrap():
+                async for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.record(request, response, timer, started, size)
+            await aflush_if_due()
+
+    def record(self, request, response, timer, started, size):
+        match = request.resolver_match
+        registry.observe(
+            view=match.url_name or match.view_name if match else UNRESOLVED,
+            method=request.method,
+            status=response.status_code,
+            seconds=time.perf_counter() - started,
+            size=size,
+            queries=timer.queries,
+            sql=timer.seconds,
+        )
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -58,6 +60,7 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = "users.User"
 
 MIDDLEWARE = [
+    "foodgram_backend.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -69,6 +72,8 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = "foodgram_backend.urls"
+# под ASGI: async-версии горячих чтений поверх ROOT_URLCONF
+ASGI_URLCONF = "foodgram_backend.asgi_urls"
 
 TEMPLATES = [
     {
@@ -93,6 +98,39 @@ WSGI_APPLICATION = "foodgram_backend.wsgi.application"
 
 DATABASES = {"default": dj_database_url.config(default="sqlite:///db.sqlite3")}
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Алиас "recipes" хранит сериализованные рецепты (см. recipes/cache.py).
+# Ключи версионируются отметкой изменения рецепта, поэтому свой
+# LocMemCache в каждом воркере не отдаёт устаревшее; общий кэш
+# (RECIPE_CACHE_BACKEND / RECIPE_CACHE_LOCATION на Redis или Memcached)
+# лишь экономит память и прогрев.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "recipes": {
+        "BACKEND": os.getenv(
+            "RECIPE_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.getenv("RECIPE_CACHE_LOCATION", "recipes"),
+        # вытесненные новой отметкой ключи живут не дольше суток
+        "TIMEOUT": int(os.getenv("RECIPE_CACHE_TIMEOUT", 24 * 60 * 60)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("RECIPE_CACHE_MAX_ENTRIES", 10000)),
+        },
+    },
+}
+
+# Метрики (см. foodgram_backend/metrics.py): воркеры gunicorn сбрасывают
+# счётчики в общий каталог, /api/metrics/ их складывает
+METRICS_DIR = os.getenv(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), "foodgram-metrics")
+)
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 1))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -172,6 +210,15 @@ USE_TZ = True
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# файлы называются хэшем содержимого (recipes/storage.py)
+STORAGES = {
+    "default": {"BACKEND": "recipes.storage.ContentAddressedStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+}
+# процессы для уменьшенных копий картинок (recipes/images.py); 0 — сразу
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
 
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "static"
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from . import metrics
+
+
+class MetricsFlushTests(SimpleTestCase):
+    """Сброс метрик из нескольких потоков одного процесса."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(
+            METRICS_DIR=self.directory, METRICS_FLUSH_INTERVAL=0
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.registry = metrics.Registry()
+
+    def observe(self, registry=None):
+        (registry or self.registry).observe(
+            "recipe-list", "GET", 200, 0.01, 10, 1, 0.001
+        )
+
+    def files(self):
+        return sorted(
+            name for name in os.listdir(self.directory) if name != metrics.LOCK
+        )
+
+    def requests_total(self):
+        counters, histograms = metrics.collect()
+        key = ("recipe-list", "GET")
+        self.assertEqual(
+            histograms[key][-1],
+            counters["foodgram_http_requests_total", key + (200,)],
+        )
+        return histograms[key][-1]
+
+    def write_worker_file(self, name, registry):
+        registry.write()
+        os.rename(
+            os.path.join(self.directory, registry.name),
+            os.path.join(self.directory, name),
+        )
+
+    def test_concurrent_flushes(self):
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(50):
+                    self.observe()
+                    self.registry.flush()
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.files(), [self.registry.name])
+        counters, _ = metrics.collect()
+        self.assertEqual(
+            counters[
+                "foodgram_http_requests_total", ("recipe-list", "GET", 200)
+            ],
+            400,
+        )
+
+    def test_write_error_does_not_fail_request(self):
+        self.observe()
+        with mock.patch.object(
+            metrics.os, "replace", side_effect=OSError
+        ), self.assertLogs(metrics.logger, "ERROR"):
+            self.registry.flush_if_due()
+        self.assertEqual(self.files(), [])
+
+    def test_reused_pid_keeps_dead_worker_totals(self):
+        # файл умершего воркера с тем же pid и чужого живого процесса
+        dead = metrics.Registry()
+        for _ in range(3):
+            self.observe(dead)
+        self.write_worker_file(f"{os.getpid()}-1.json", dead)
+        alive = metrics.Registry()
+        self.observe(alive)
+        self.write_worker_file("1-1.json", alive)
+
+        self.observe()
+        self.registry.flush()
+        self.assertEqual(
+            self.files(),
+            ["1-1.json", self.registry.name, metrics.DEAD_WORKERS],
+        )
+        self.assertEqual(self.requests_total(), 5)
+
+        # следующий процесс с тем же pid не учитывает их второй раз
+        successor = metrics.Registry()
+        self.observe(successor)
+        successor.flush()
+        self.assertEqual(
+            self.files(), ["1-1.json", successor.name, metrics.DEAD_WORKERS]
+        )
+        self.assertEqual(self.requests_total(), 6)
+
+    def test_merge_crash_is_not_counted_twice(self):
+        dead = metrics.Registry()
+        self.observe(dead)
+        self.write_worker_file("999999999-1.json", dead)
+        with mock.patch.object(metrics.os, "unlink", side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.registry.flush()
+        self.assertEqual(
+            self.files(), ["999999999-1.json", metrics.DEAD_WORKERS]
+        )
+        self.assertEqual(self.requests_total(), 1)
+        self.registry.flush()
+        self.assertEqual(self.requests_total(), 1)
+        self.assertEqual(
+            self.files(), [self.registry.name, metrics.DEAD_WORKERS]
+        )
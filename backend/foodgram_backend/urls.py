@@ -5,8 +5,12 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    # Метрики Prometheus, наружу закрыты в nginx
+    path("api/metrics/", metrics_view, name="metrics"),
     path("api/users/", include("users.urls", namespace="users")),
     # Djoser токены (только auth)
     path("api/auth/", include("djoser.urls.authtoken")),
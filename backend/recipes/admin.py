@@ -1,6 +1,8 @@
 from django.contrib import admin
 from users.models import Subscription
 
+from . import shopping_totals
+
 from .models import (
     Favorite,
     Ingredient,
@@ -18,14 +20,24 @@ class RecipeIngredientInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "author", "favorite_count")
+    list_display = (
+        "id",
+        "name",
+        "author",
+        "favorites_count",
+        "carts_count",
+    )
     list_filter = ("author",)
     search_fields = ("name", "author__username")
+    readonly_fields = ("favorites_count", "carts_count")
     inlines = (RecipeIngredientInline,)
 
-    @admin.display(description="В избранном, раз")
-    def favorite_count(self, obj):
-        return obj.favorited.count()
+    def save_formset(self, request, form, formset, change):
+        # состав меняется мимо сериализатора — итоги корзин тоже здесь
+        if formset.model is not RecipeIngredient:
+            return super().save_formset(request, form, formset, change)
+        with shopping_totals.recipe_change(form.instance.pk):
+            super().save_formset(request, form, formset, change)
 
 
 @admin.register(Ingredient)
@@ -34,7 +46,25 @@ class IngredientAdmin(admin.ModelAdmin):
     search_fields = ("name",)
 
 
-admin.site.register(RecipeIngredient)
+@admin.register(RecipeIngredient)
+class RecipeIngredientAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        recipe_ids = [obj.recipe_id]
+        if change and "recipe" in form.changed_data:
+            recipe_ids.append(form.initial["recipe"])
+        with shopping_totals.recipes_change(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with shopping_totals.recipe_change(obj.recipe_id):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = queryset.values_list("recipe_id", flat=True)
+        with shopping_totals.recipes_change(list(recipe_ids)):
+            super().delete_queryset(request, queryset)
+
+
 admin.site.register(Favorite)
 admin.site.register(ShoppingCart)
 admin.site.register(Subscription)
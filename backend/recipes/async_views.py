@@ -0,0 +1,176 @@
+"""
+Async-версии самых частых чтений для запуска под ASGI.
+
+Список и карточка рецепта, короткая ссылка и автодополнение
+ингредиентов обслуживаются без занятого на весь запрос потока воркера.
+Всё, что у DRF-view настраивается классами, берётся у того же view из
+ROOT_URLCONF: аутентификация, права, троттлинг и выбор рендерера —
+его initial(), пагинация — его paginator (async-вариант с acount() и
+async for), сериализация — его get_serializer(). Через sync_to_async
+идут только initial() и сериализация уже загруженных строк. Поэтому
+ответ совпадает с ответом DRF-view байт в байт, включая заголовки.
+Всё, что отличается от обычного чтения (запись, браузерный API, отказ
+в доступе, ошибки фильтров и страниц, 404), отдаётся самому
+синхронному view — так редкие ветки не дублируются.
+
+Маршруты подключает foodgram_backend/asgi_urls.py; WSGI их не видит.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import SynchronousOnlyOperation
+from django.http import Http404, HttpResponse
+from django.urls import resolve, reverse
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+
+from .catalog import ingredient_index
+from .filters import NameSearchFilter
+from .images import QUERY_PARAM as VARIANTS_PARAM
+from .models import Recipe
+
+
+class Delegate(Exception):
+    """Запрос не для быстрого пути — ответит синхронный DRF-view."""
+
+
+def async_view(view):
+    """
+    Оборачивает корутину: при Delegate вызывает view из ROOT_URLCONF.
+    csrf_exempt в Django 4.2 не умеет корутины, флаг ставится вручную
+    (как у DRF-view: чужие сессии здесь не читаются).
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        match = resolve(request.path_info, urlconf=settings.ROOT_URLCONF)
+        if request.method == "GET":
+            try:
+                return await view(request, match, *args, **kwargs)
+            except Delegate:
+                pass
+        return await sync_to_async(match.func)(
+            request, *match.args, **match.kwargs
+        )
+
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+async def call(func, *args, **kwargs):
+    """Синхронная часть DRF в потоке; её ошибка — ответ DRF-view."""
+    try:
+        return await sync_to_async(func)(*args, **kwargs)
+    except (APIException, Http404):
+        raise Delegate
+
+
+async def drf_view(request, match):
+    """
+    Экземпляр DRF-view маршрута, как его готовит as_view(), после
+    initial(): пользователь, права, троттлинг и рендерер определены.
+    """
+    func = match.func
+    view = func.cls(**func.initkwargs)
+    view.action_map = func.actions
+    for method, action in func.actions.items():
+        setattr(view, method, getattr(view, action))
+    view.setup(request, *match.args, **match.kwargs)
+    view.request = view.initialize_request(
+        request, *match.args, **match.kwargs
+    )
+    view.headers = view.default_response_headers
+    await call(view.initial, view.request, *match.args, **match.kwargs)
+    # браузерный API рендерит шаблоны — это дело синхронного view
+    if not isinstance(view.request.accepted_renderer, JSONRenderer):
+        raise Delegate
+    return view
+
+
+def json_response(view, data):
+    """Как Response(data) после finalize_response у DRF-view."""
+    request = view.request
+    renderer = request.accepted_renderer
+    response = HttpResponse(
+        renderer.render(
+            data,
+            request.accepted_media_type,
+            {"view": view, "request": request},
+        ),
+        content_type=renderer.media_type,
+    )
+    for name, value in view.headers.items():
+        response[name] = value
+    return response
+
+
+async def serialize(serializer):
+    # фрагменты рецептов живут в кэше "recipes" с синхронным клиентом
+    return await sync_to_async(lambda: serializer.data)()
+
+
+def only_variants(request):
+    """Фильтры применяются и к карточке — с ними ответит DRF."""
+    if set(request.GET) - {VARIANTS_PARAM}:
+        raise Delegate
+
+
+async def filter_queryset(view):
+    """
+    Фильтры только строят запрос; в потоке — лишь если фильтру нужна
+    БД (?author= проверяет, что автор существует).
+    """
+    try:
+        return view.filter_queryset(view.get_queryset())
+    except SynchronousOnlyOperation:
+        return await call(view.filter_queryset, view.get_queryset())
+    except (APIException, Http404):
+        raise Delegate
+
+
+@async_view
+async def recipe_list(request, match):
+    view = await drf_view(request, match)
+    queryset = await filter_queryset(view)
+    # COUNT через acount(), страница с prefetch — через async for
+    try:
+        page = await view.paginator.apaginate_queryset(
+            queryset, view.request, view
+        )
+    except APIException:
+        raise Delegate
+    data = await serialize(view.get_serializer(page, many=True))
+    return json_response(view, view.get_paginated_response(data).data)
+
+
+@async_view
+async def recipe_detail(request, match, pk):
+    only_variants(request)
+    view = await drf_view(request, match)
+    recipe = await view.get_queryset().filter(pk=pk).afirst()
+    if recipe is None:
+        raise Delegate
+    await call(view.check_object_permissions, view.request, recipe)
+    return json_response(view, await serialize(view.get_serializer(recipe)))
+
+
+@async_view
+async def recipe_get_link(request, match, pk):
+    only_variants(request)
+    view = await drf_view(request, match)
+    if not await Recipe.objects.filter(pk=pk).aexists():
+        raise Delegate
+    link = view.request.build_absolute_uri(reverse("recipe-detail", args=[pk]))
+    return json_response(view, {"short-link": link})
+
+
+@async_view
+async def ingredient_list(request, match):
+    # весь каталог — готовый сжатый ответ с ETag у синхронного view
+    name = request.GET.get(NameSearchFilter.search_param)
+    if not name:
+        raise Delegate
+    view = await drf_view(request, match)
+    return json_response(view, await ingredient_index.asearch(name))
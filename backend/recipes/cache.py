@@ -0,0 +1,59 @@
+"""
+Кэш не зависящего от зрителя JSON рецепта.
+
+Ключ фрагмента — ``recipe:<id>:<updated>``: в него входит отметка
+Recipe.updated из той же строки, что читает запрос. Любая правка
+рецепта, его состава или профиля автора сдвигает отметку (invalidate)
+в транзакции записи, поэтому после коммита все воркеры ищут фрагмент
+под новым ключом, даже если у каждого свой LocMemCache, а фрагмент,
+собранный читателем до коммита, ложится под старый ключ и уже не
+читается. Старые ключи истекают по TIMEOUT алиаса ``recipes``.
+
+Версия ``FRAGMENT_VERSION`` (версионирование ключей Django cache)
+меняется вместе с форматом ответа. Бэкенд задаётся алиасом ``recipes``
+в ``settings.CACHES``: LocMemCache вытесняет давно не читавшиеся
+записи (LRU) сверх MAX_ENTRIES; общий для воркеров кэш (Redis,
+Memcached) экономит память, FileBasedCache при переполнении удаляет
+случайную долю записей.
+"""
+
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import Recipe
+
+CACHE_ALIAS = "recipes"
+# увеличить при изменении формата RecipeSerializer
+FRAGMENT_VERSION = 1
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(recipe):
+    return f"recipe:{recipe.pk}:{recipe.updated.timestamp():.6f}"
+
+
+def get_fragments(recipes):
+    """Возвращает {id: фрагмент} для найденных в кэше рецептов."""
+    keys = {_key(recipe): recipe.pk for recipe in recipes}
+    found = _cache().get_many(keys, version=FRAGMENT_VERSION)
+    return {keys[key]: fragment for key, fragment in found.items()}
+
+
+def set_fragments(fragments):
+    """fragments — {рецепт: фрагмент}; ключ берётся из строки рецепта."""
+    if fragments:
+        _cache().set_many(
+            {_key(recipe): fragment for recipe, fragment in fragments.items()},
+            version=FRAGMENT_VERSION,
+        )
+
+
+def invalidate(recipe_ids):
+    """
+    Сдвигает отметку изменения рецептов (id или queryset id) —
+    вызывать внутри транзакции записи.
+    """
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated=timezone.now())
@@ -0,0 +1,203 @@
+"""
+Справочник ингредиентов в памяти процесса.
+
+Каталог почти не меняется, поэтому автодополнение ``?name=`` отвечает
+из отсортированного индекса без обращения к БД. Версия каталога
+берётся из самой БД — (число строк, max(Ingredient.updated)) — и потому
+одна для всех воркеров и для правок из других процессов
+(load_ingredients, админка соседнего воркера). Процесс сверяет её не
+чаще раза в VERSION_TTL секунд; свои правки (сигналы) сбрасывают
+отметку сразу. Индекс и готовый ответ собираются целиком и
+подменяются одним присваиванием, поэтому читатели без блокировки
+видят либо старый, либо новый снимок.
+"""
+
+import gzip
+import hashlib
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple
+
+from django.db.models import Count, Max
+from rest_framework.renderers import JSONRenderer
+
+from .models import Ingredient
+
+try:
+    import brotli
+except ImportError:  # сжатие br необязательно
+    brotli = None
+
+# на сколько секунд процесс может отстать от чужой правки каталога
+VERSION_TTL = 5.0
+# больше любого символа — верхняя граница диапазона префикса
+PREFIX_END = chr(0x10FFFF)
+
+
+class CatalogVersion:
+    """Версия каталога из БД, закэшированная в процессе на VERSION_TTL."""
+
+    def __init__(self):
+        self.value = None
+        self.checked_at = float("-inf")
+
+    @staticmethod
+    def _query():
+        return Ingredient.objects.order_by()
+
+    def _store(self, row):
+        self.value = (row["total"], row["updated"])
+        self.checked_at = time.monotonic()
+        return self.value
+
+    def _expired(self):
+        return time.monotonic() - self.checked_at > VERSION_TTL
+
+    def get(self):
+        if self._expired():
+            return self._store(
+                self._query().aggregate(
+                    total=Count("id"), updated=Max("updated")
+                )
+            )
+        return self.value
+
+    async def aget(self):
+        if self._expired():
+            return self._store(
+                await self._query().aaggregate(
+                    total=Count("id"), updated=Max("updated")
+                )
+            )
+        return self.value
+
+    def expire(self):
+        self.checked_at = float("-inf")
+
+
+catalog_version = CatalogVersion()
+
+
+def bump_catalog_version():
+    """Каталог изменён в этом процессе: сверить версию при следующем чтении."""
+    catalog_version.expire()
+
+
+class Catalog(NamedTuple):
+    version: tuple
+    keys: list
+    names: list
+    ids: array
+    unit_refs: array
+    units: tuple
+
+
+class IngredientIndex:
+    """
+    Отсортированные по casefold-названию ключи и параллельные массивы:
+    id в array('q'), единицы измерения — номерами в кортеже уникальных.
+    Поиск по префиксу — два бинарных поиска.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.catalog = Catalog(None, [], [], array("q"), array("H"), ())
+
+    @staticmethod
+    def _rows():
+        return Ingredient.objects.values_list("id", "name", "measurement_unit")
+
+    @staticmethod
+    def _build(rows, version):
+        rows = sorted(
+            (name.casefold(), name, pk, unit) for pk, name, unit in rows
+        )
+        units = sorted({row[3] for row in rows})
+        unit_index = {unit: i for i, unit in enumerate(units)}
+        return Catalog(
+            version=version,
+            keys=[row[0] for row in rows],
+            names=[row[1] for row in rows],
+            ids=array("q", (row[2] for row in rows)),
+            unit_refs=array("H", (unit_index[row[3]] for row in rows)),
+            units=tuple(units),
+        )
+
+    def search(self, prefix):
+        """Ингредиенты, чьё название начинается с prefix (без регистра)."""
+        version = catalog_version.get()
+        catalog = self.catalog
+        if catalog.version != version:
+            # один процесс строит, остальные потоки ждут готовый снимок
+            with self._lock:
+                catalog = self.catalog
+                if catalog.version != version:
+                    catalog = self.catalog = self._build(self._rows(), version)
+        return self._lookup(catalog, prefix)
+
+    async def asearch(self, prefix):
+        """То же для async-view: каталог перечитывается async ORM."""
+        version = await catalog_version.aget()
+        catalog = self.catalog
+        if catalog.version != version:
+            rows = [row async for row in self._rows()]
+            catalog = self.catalog = self._build(rows, version)
+        return self._lookup(catalog, prefix)
+
+    @staticmethod
+    def _lookup(catalog, prefix):
+        prefix = prefix.casefold()
+        lo = bisect_left(catalog.keys, prefix)
+        hi = bisect_right(catalog.keys, prefix + PREFIX_END, lo)
+        return [
+            {
+                "id": catalog.ids[i],
+                "name": catalog.names[i],
+                "measurement_unit": catalog.units[catalog.unit_refs[i]],
+            }
+            for i in range(lo, hi)
+        ]
+
+
+class CatalogResponse:
+    """
+    Полный список ингредиентов, сериализованный один раз на версию
+    каталога: JSON, его gzip- и brotli-варианты и сильный ETag.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (версия, etag, {кодирование: тело}) — подменяется целиком
+        self.snapshot = (None, None, {})
+
+    @staticmethod
+    def _build(version):
+        from .serializers import IngredientSerializer
+
+        body = JSONRenderer().render(
+            IngredientSerializer(Ingredient.objects.all(), many=True).data
+        )
+        variants = {
+            "identity": body,
+            "gzip": gzip.compress(body, mtime=0),
+        }
+        if brotli is not None:
+            variants["br"] = brotli.compress(body)
+        return version, f'"{hashlib.sha256(body).hexdigest()}"', variants
+
+    def get(self):
+        """Возвращает (etag, {кодирование: тело}) для текущей версии."""
+        version = catalog_version.get()
+        snapshot = self.snapshot
+        if snapshot[0] != version:
+            with self._lock:
+                snapshot = self.snapshot
+                if snapshot[0] != version:
+                    snapshot = self.snapshot = self._build(version)
+        return snapshot[1], snapshot[2]
+
+
+ingredient_index = IngredientIndex()
+catalog_response = CatalogResponse()
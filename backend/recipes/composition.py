@@ -0,0 +1,248 @@
+"""
+Обратный индекс ингредиент → рецепты для подбора «из того, что есть».
+
+В каждом процессе: для ингредиента — отсортированный array('q') id
+рецептов, для рецепта — число ингредиентов в array('H') по id. Записи
+состава отмечаются в журнале CompositionChange в той же транзакции;
+перед запросом процесс дочитывает журнал и перестраивает только
+изменившиеся рецепты. Id журнала выдаются при вставке, а видны после
+коммита, поэтому пропуски в нумерации перечитываются, пока не истечёт
+GAP_TIMEOUT (откаченные транзакции оставляют пропуски навсегда).
+
+Индекс — неизменяемый снимок, который подменяется одним присваиванием:
+запросы ранжируют по текущему снимку без блокировки, журнал дочитывает
+один поток (остальные в это время отвечают по прежнему снимку), правка
+копирует только затронутые списки. Полная пересборка идёт в фоновом
+потоке; до её конца отвечает старый снимок. Синхронно индекс строится
+только при первом запросе процесса, когда отвечать ещё нечем.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from datetime import timedelta
+from operator import sub, truediv
+from typing import NamedTuple
+
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import CompositionChange, RecipeIngredient
+
+# журнал старше этого удаляется; отставший сильнее процесс строит заново
+LOG_TTL = timedelta(hours=1)
+PRUNE_EVERY = 1000
+GAP_TIMEOUT = 300
+BATCH_SIZE = 2000
+REBUILD_THRESHOLD = 500
+
+logger = logging.getLogger(__name__)
+
+
+def changed(recipe_ids):
+    """Отмечает смену состава; вызывать внутри транзакции записи."""
+    entries = CompositionChange.objects.bulk_create(
+        CompositionChange(recipe_id=pk) for pk in recipe_ids
+    )
+    # id есть не на всех СУБД — тогда чистим по времени при сбросе
+    if any(entry.pk and entry.pk % PRUNE_EVERY == 0 for entry in entries):
+        prune()
+
+
+def reset():
+    """После массовой загрузки: все процессы построят индекс заново."""
+    CompositionChange.objects.create(recipe_id=None)
+    prune()
+
+
+def prune():
+    CompositionChange.objects.filter(
+        created__lt=timezone.now() - LOG_TTL
+    ).delete()
+
+
+class Snapshot(NamedTuple):
+    postings: dict
+    sizes: array
+    # последний прочитанный id журнала и пропуски {id: когда замечен}
+    last_id: int
+    gaps: dict
+    refreshed_at: float
+
+
+class CompositionIndex:
+    def __init__(self):
+        # журнал дочитывает и индекс пересобирает один поток за раз
+        self._refresh_lock = threading.Lock()
+        self.snapshot = None
+        self.rebuild_thread = None
+
+    @staticmethod
+    def _build():
+        # сначала позиция в журнале: правки во время чтения повторятся
+        last_id = (
+            CompositionChange.objects.aggregate(last=Max("id"))["last"] or 0
+        )
+        postings = defaultdict(lambda: array("q"))
+        sizes = array("H")
+        rows = (
+            RecipeIngredient.objects.order_by("ingredient_id", "recipe_id")
+            .values_list("ingredient_id", "recipe_id")
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+        for ingredient_id, recipe_id in rows:
+            postings[ingredient_id].append(recipe_id)
+            if recipe_id >= len(sizes):
+                sizes.extend([0] * (recipe_id + 1 - len(sizes)))
+            sizes[recipe_id] += 1
+        return Snapshot(dict(postings), sizes, last_id, {}, time.monotonic())
+
+    @staticmethod
+    def _apply(snapshot, recipe_ids, rows, **changes):
+        """Новый снимок с перечитанным составом recipe_ids."""
+        postings = dict(snapshot.postings)
+        sizes = array("H", snapshot.sizes)
+        copied = set()
+
+        def writable(ingredient_id):
+            if ingredient_id not in copied:
+                postings[ingredient_id] = array(
+                    "q", postings.get(ingredient_id, ())
+                )
+                copied.add(ingredient_id)
+            return postings[ingredient_id]
+
+        for ingredient_id, posting in snapshot.postings.items():
+            for recipe_id in recipe_ids:
+                i = bisect_left(posting, recipe_id)
+                if i < len(posting) and posting[i] == recipe_id:
+                    target = writable(ingredient_id)
+                    del target[bisect_left(target, recipe_id)]
+        for recipe_id in recipe_ids:
+            if recipe_id < len(sizes):
+                sizes[recipe_id] = 0
+        for ingredient_id, recipe_id in rows:
+            insort(writable(ingredient_id), recipe_id)
+            if recipe_id >= len(sizes):
+                sizes.extend([0] * (recipe_id + 1 - len(sizes)))
+            sizes[recipe_id] += 1
+        return snapshot._replace(postings=postings, sizes=sizes, **changes)
+
+    def _rebuild_in_background(self):
+        """Пересборка в потоке; блокировку обновления отпустит он."""
+
+        def run():
+            try:
+                self.snapshot = self._build()
+            except Exception:
+                logger.exception("Не удалось перестроить индекс состава")
+            finally:
+                connection.close()
+                self._refresh_lock.release()
+
+        self.rebuild_thread = threading.Thread(
+            target=run, name="composition-index", daemon=True
+        )
+        self.rebuild_thread.start()
+
+    def _refresh(self):
+        """
+        Дочитывает журнал; вызывается под _refresh_lock. True — начата
+        фоновая пересборка и блокировка перешла к её потоку.
+        """
+        snapshot = self.snapshot
+        now = time.monotonic()
+        # журнал за время простоя мог быть очищен — только заново
+        if now - snapshot.refreshed_at > LOG_TTL.total_seconds() / 2:
+            self._rebuild_in_background()
+            return True
+        gaps = {
+            pk: seen
+            for pk, seen in snapshot.gaps.items()
+            if now - seen < GAP_TIMEOUT
+        }
+        entries = list(
+            CompositionChange.objects.filter(
+                Q(id__gt=snapshot.last_id) | Q(id__in=gaps)
+            )
+            .order_by("id")
+            .values_list("id", "recipe_id")
+        )
+        if not entries:
+            self.snapshot = snapshot._replace(gaps=gaps, refreshed_at=now)
+            return False
+        recipe_ids = sorted({recipe_id for _, recipe_id in entries})
+        # точечная правка проходит по всем спискам на каждый рецепт
+        if None in recipe_ids or len(recipe_ids) > REBUILD_THRESHOLD:
+            self._rebuild_in_background()
+            return True
+        seen = {pk for pk, _ in entries}
+        for pk in seen:
+            gaps.pop(pk, None)
+        newest = max(seen)
+        for pk in range(snapshot.last_id + 1, newest):
+            if pk not in seen:
+                gaps[pk] = now
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list("ingredient_id", "recipe_id")
+        self.snapshot = self._apply(
+            snapshot,
+            recipe_ids,
+            list(rows),
+            last_id=max(snapshot.last_id, newest),
+            gaps=gaps,
+            refreshed_at=now,
+        )
+        return False
+
+    def current(self):
+        """Актуальный снимок; занятое обновление не ждём."""
+        if self.snapshot is None:
+            with self._refresh_lock:
+                if self.snapshot is None:
+                    self.snapshot = self._build()
+            return self.snapshot
+        if self._refresh_lock.acquire(blocking=False):
+            handed_over = False
+            try:
+                handed_over = self._refresh()
+            finally:
+                if not handed_over:
+                    self._refresh_lock.release()
+        return self.snapshot
+
+    def top(self, ingredient_ids, limit):
+        """
+        До limit рецептов по доле покрытия набором ingredient_ids,
+        при равной доле — с меньшим числом недостающих, затем новее.
+        Возвращает [(recipe_id, совпало, всего)].
+        """
+        snapshot = self.current()
+        hits = Counter()
+        for ingredient_id in set(ingredient_ids):
+            hits.update(snapshot.postings.get(ingredient_id, ()))
+        # ключи сравнения собираются map/zip без цикла на Python
+        ids = list(hits)
+        matched = list(hits.values())
+        totals = list(map(snapshot.sizes.__getitem__, ids))
+        best = heapq.nlargest(
+            limit,
+            zip(
+                map(truediv, matched, totals),
+                map(sub, matched, totals),
+                ids,
+            ),
+        )
+        return [
+            (pk, snapshot.sizes[pk] + difference, snapshot.sizes[pk])
+            for _, difference, pk in best
+        ]
+
+
+composition_index = CompositionIndex()
@@ -1,3 +1,7 @@
 NAME_MAX_LENGTH = 200
 UNIT_MAX_LENGTH = 50
 PAGE_SIZE = 10
+BY_INGREDIENTS_MAX_LIMIT = 100
+FEED_MAX_LIMIT = 100
+TRENDING_ORDERING = ("-trending_score", "-trending_id")
+SHOPPING_LIST_CHUNK_SIZE = 500
@@ -0,0 +1,56 @@
+"""
+Денормализованные счётчики популярности.
+
+Колонки обновляются сигналами одним UPDATE ... SET n = n ± 1 в той же
+транзакции, что и связь; ``reconcile`` пересчитывает их из таблиц
+связей и исправляет расхождения массовыми UPDATE.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from users.models import Subscription, User
+
+from .models import Favorite, Recipe, ShoppingCart
+
+# (модель со счётчиком, поле счётчика, модель связи, FK на счётчик)
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite, "recipe"),
+    (Recipe, "carts_count", ShoppingCart, "recipe"),
+    (User, "recipes_count", Recipe, "author"),
+    (User, "followers_count", Subscription, "author"),
+)
+
+
+def increment(model, pk, field, delta=1):
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def actual_count(relation, fk):
+    return Coalesce(
+        Subquery(
+            relation.objects.filter(**{fk: OuterRef("pk")})
+            .order_by()
+            .values(fk)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+@transaction.atomic
+def reconcile():
+    """Исправляет расхождения; возвращает {поле: число исправленных}."""
+    fixed = {}
+    for model, field, relation, fk in COUNTERS:
+        drifted = model.objects.annotate(
+            actual=actual_count(relation, fk)
+        ).exclude(**{field: F("actual")})
+        fixed[f"{model._meta.model_name}.{field}"] = model.objects.filter(
+            pk__in=drifted.values("pk")
+        ).update(**{field: actual_count(relation, fk)})
+    return fixed
@@ -1,7 +1,10 @@
 from django.contrib.auth import get_user_model
+from django.db.models import F
 from django_filters import rest_framework as filters
 from rest_framework.filters import BaseFilterBackend
 
+from .constants import TRENDING_ORDERING
+from .search import search as search_recipes
 from .models import Recipe
 
 User = get_user_model()
@@ -33,6 +36,12 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_in_shopping_cart"
     )
+    # полнотекстовый поиск по названию и описанию, см. recipes/search.py
+    search = filters.CharFilter(method="filter_search")
+    # «в тренде»: рейтинг из recipes/trending.py, по его индексу
+    ordering = filters.ChoiceFilter(
+        choices=(("trending", "trending"),), method="filter_ordering"
+    )
 
     class Meta:
         model = Recipe
@@ -40,6 +49,8 @@ class RecipeFilter(filters.FilterSet):
             "author",
             "is_favorited",
             "is_in_shopping_cart",
+            "search",
+            "ordering",
         )
 
     def filter_favorited(self, queryset, name, value):
@@ -51,3 +62,18 @@ class RecipeFilter(filters.FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(in_carts__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return (
+            queryset.filter(trending__isnull=False)
+            # id из таблицы рейтинга — сортировка целиком по её индексу
+            .annotate(
+                trending_score=F("trending__score"),
+                trending_id=F("trending__recipe"),
+            ).order_by(*TRENDING_ORDERING)
+        )
@@ -0,0 +1,185 @@
+"""
+Уменьшенные копии картинок рецептов и аватаров.
+
+После коммита загрузки картинка уходит в пул процессов, который
+сохраняет рядом с оригиналом thumb/medium в WebP и JPEG. Готовые пути
+записываются в <поле>_variants вместе с именем исходника: если картинку
+успели заменить, устаревшие копии не отдаются. Пока копий нет, клиент
+пользуется оригиналом.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# имя → наибольшая сторона, px
+SIZES = {"thumb": 320, "medium": 960}
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+# ?variants=1 включает в ответ карты размеров
+QUERY_PARAM = "variants"
+
+_executor = None
+
+
+def variants_field(field_name):
+    return f"{field_name}_variants"
+
+
+def variant_name(name, size, extension):
+    """recipes/abc.png → recipes/variants/abc.thumb.webp"""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, "variants", f"{stem}.{size}.{extension}")
+
+
+def render_variants(source, targets):
+    """
+    Выполняется в дочернем процессе: только PIL и файловая система.
+    targets — [(путь, наибольшая сторона, формат PIL, параметры)].
+    """
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    flat = image
+    if image.mode == "RGBA":
+        # у JPEG нет прозрачности — кладём на белый фон
+        flat = Image.new("RGB", image.size, "white")
+        flat.paste(image, mask=image.getchannel("A"))
+    for path, side, fmt, params in targets:
+        copy = (flat if fmt == "JPEG" else image).copy()
+        copy.thumbnail((side, side), Image.LANCZOS)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            copy.save(file, fmt, **params)
+        os.replace(temporary, path)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        # spawn: воркер gunicorn уже многопоточный, fork здесь небезопасен
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def is_stale(instance, field_name):
+    file = getattr(instance, field_name)
+    variants = getattr(instance, variants_field(field_name))
+    return bool(file) and variants.get("source") != file.name
+
+
+def build(model, field_name, source, pks, executor=None):
+    """
+    Отправляет файл source в пул; копии достаются всем объектам pks,
+    у которых он всё ещё стоит. Возвращает future или None.
+    """
+    storage = model._meta.get_field(field_name).storage
+    variants = {"source": source}
+    targets = []
+    for size, side in SIZES.items():
+        variants[size] = {}
+        for extension, (fmt, params) in FORMATS.items():
+            name = variant_name(source, size, extension)
+            variants[size][extension] = name
+            targets.append((storage.path(name), side, fmt, params))
+    if executor is None and not settings.IMAGE_WORKERS:
+        # без пула — прямо в колбэке on_commit, с той же обработкой ошибок
+        complete(
+            partial(render_variants, storage.path(source), targets),
+            model,
+            pks,
+            field_name,
+            variants,
+        )
+        return None
+    future = (executor or get_executor()).submit(
+        render_variants, storage.path(source), targets
+    )
+    future.add_done_callback(
+        lambda done: finish(done, model, pks, field_name, variants)
+    )
+    return future
+
+
+def finish(future, model, pks, field_name, variants):
+    """Колбэк пула: выполняется в служебном потоке родителя."""
+    try:
+        complete(future.result, model, pks, field_name, variants)
+    finally:
+        connections.close_all()
+
+
+def complete(render, model, pks, field_name, variants):
+    """
+    Дожидается копий и записывает пути. Ошибка (нет исходника, битый
+    файл) только пишется в журнал: сохранение объекта она не роняет.
+    """
+    try:
+        render()
+        save_variants(model, pks, field_name, variants)
+    except Exception:
+        logger.exception("Не удалось уменьшить %s", variants["source"])
+
+
+def save_variants(model, pks, field_name, variants):
+    # картинку могли заменить, пока пул работал
+    for instance in model.objects.filter(
+        pk__in=pks, **{field_name: variants["source"]}
+    ):
+        setattr(instance, variants_field(field_name), variants)
+        # save, а не update: сигналы сбросят кэш фрагментов рецептов
+        instance.save(update_fields=[variants_field(field_name)])
+
+
+def schedule(instance, field_name):
+    """Ставит уменьшение в очередь после коммита загрузки."""
+    if is_stale(instance, field_name):
+        source = getattr(instance, field_name).name
+        transaction.on_commit(
+            lambda: build(type(instance), field_name, source, [instance.pk])
+        )
+
+
+def wants_variants(context):
+    request = context.get("request")
+    return request is not None and request.query_params.get(
+        QUERY_PARAM, ""
+    ).lower() in ("1", "true")
+
+
+def variant_urls(file, variants, absolute=str):
+    """srcset-карта {размер: {формат: url}} для готовых копий."""
+    if not file or variants.get("source") != file.name:
+        return {}
+    return {
+        size: {
+            extension: absolute(file.storage.url(name))
+            for extension, name in variants[size].items()
+        }
+        for size in SIZES
+        if size in variants
+    }
+
+
+def absolutize(urls, absolute):
+    return {
+        size: {extension: absolute(url) for extension, url in formats.items()}
+        for size, formats in urls.items()
+    }
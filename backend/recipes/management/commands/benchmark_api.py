@@ -0,0 +1,377 @@
+import base64
+import io
+import json
+import pathlib
+import random
+import re
+import tempfile
+import time
+from urllib.parse import quote
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections, connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from recipes import cache
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from rest_framework.authtoken.models import Token
+from users.models import Subscription, User
+
+from .generate_dataset import EMAIL_TEMPLATE, PASSWORD
+
+SCHEMA = pathlib.Path(settings.BASE_DIR).parent / "docs" / "openapi-schema.yml"
+PATH_LINE = re.compile(r"^  (/\S*):\s*$")
+METHOD_LINE = re.compile(r"^    (get|post|put|patch|delete):\s*$")
+
+
+def schema_endpoints(path):
+    """Пары (METHOD, путь) из раздела paths схемы OpenAPI."""
+    endpoints, current, in_paths = [], None, False
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line and not line.startswith(" "):
+            current = None
+            in_paths = line.startswith("paths:")
+            continue
+        match = PATH_LINE.match(line)
+        if match and in_paths:
+            current = match.group(1)
+            continue
+        match = METHOD_LINE.match(line)
+        if match and current:
+            endpoints.append((match.group(1).upper(), current))
+    return endpoints
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def png_base64():
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), "green").save(buffer, "PNG")
+    return (
+        "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогоняет все эндпоинты docs/openapi-schema.yml через WSGI-"
+        "приложение на наборе generate_dataset и сохраняет p50/p95/p99, "
+        "число SQL-запросов и размер ответа как JSON-базу для сравнения"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", type=pathlib.Path)
+        parser.add_argument(
+            "--compare",
+            type=pathlib.Path,
+            help="сравнить с ранее сохранённой базой",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=1.25,
+            help="во сколько раз p95 может вырасти без регрессии",
+        )
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def handle(self, *args, **options):
+        self.setup_context(random.Random(options["seed"]))
+        self.app = get_wsgi_application()
+        specs, results, skipped = self.specs(), {}, []
+        # как тестовый клиент: иначе сигналы закроют соединение посреди
+        # транзакции, которая откатывает пишущие запросы
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        # загруженные картинки не откатываются вместе с транзакцией
+        media = tempfile.TemporaryDirectory()
+        try:
+            with override_settings(MEDIA_ROOT=media.name):
+                for method, path in schema_endpoints(SCHEMA):
+                    spec = specs.get((method, path))
+                    if spec is None:
+                        skipped.append(f"{method} {path}")
+                        continue
+                    name = f"{method} {path}"
+                    results[name] = self.measure(method, spec, options)
+                    self.stdout.write(
+                        f"{name:45} p95={results[name]['p95_ms']:8.2f} мс "
+                        f"queries={results[name]['queries']:3} "
+                        f"bytes={results[name]['bytes']}"
+                    )
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+            # пишущие запросы откачены, а фрагменты могли попасть в кэш
+            cache.invalidate(self.mutated_recipes)
+            media.cleanup()
+
+        report = {
+            "meta": {
+                "requests": options["requests"],
+                "seed": options["seed"],
+                "database": connection.vendor,
+                "recipes": Recipe.objects.count(),
+                "users": User.objects.count(),
+                "skipped": skipped,
+            },
+            "endpoints": results,
+        }
+        if options["output"]:
+            options["output"].write_text(
+                json.dumps(report, ensure_ascii=False, indent=2),
+                encoding="utf-8",
+            )
+            self.stdout.write(f"База сохранена в {options['output']}")
+        for name in skipped:
+            self.stderr.write(f"Нет сценария: {name}")
+        if options["compare"]:
+            self.compare(report, options)
+
+    def setup_context(self, rnd):
+        try:
+            self.user = User.objects.get(email=EMAIL_TEMPLATE.format(0))
+        except User.DoesNotExist:
+            raise CommandError(
+                "Нет набора данных — запустите generate_dataset"
+            )
+        self.token = Token.objects.get_or_create(user=self.user)[0].key
+        self.own_recipe = self.user.recipes.order_by("pk").first()
+        if self.own_recipe is None:
+            raise CommandError(f"У {self.user.email} нет рецептов")
+        others = Recipe.objects.exclude(author=self.user).order_by("pk")
+        self.recipe = others[rnd.randrange(others.count())]
+        self.author = self.recipe.author
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by("pk").values_list("pk", flat=True)[:5]
+        )
+        self.prefix = Ingredient.objects.order_by("pk").first().name[:2]
+        self.image = png_base64()
+        self.mutated_recipes = [self.own_recipe.pk]
+
+    def recipe_body(self):
+        return {
+            "name": "Замер",
+            "text": "Рецепт для замера",
+            "cooking_time": 10,
+            "image": self.image,
+            "ingredients": [
+                {"id": pk, "amount": 10} for pk in self.ingredient_ids
+            ],
+        }
+
+    def specs(self):
+        """(METHOD, путь схемы) → (url, тело, подготовка в транзакции)."""
+        recipe, own, author = self.recipe.pk, self.own_recipe.pk, self.author
+        user = self.user
+
+        def relation(model, present, **lookup):
+            def setup():
+                model.objects.filter(**lookup).delete()
+                if present:
+                    model.objects.create(**lookup)
+
+            return setup
+
+        favorite = {"user": user, "recipe": self.recipe}
+        subscription = {"user": user, "author": author}
+        return {
+            ("GET", "/api/users/"): ("/api/users/?limit=6", None, None),
+            ("POST", "/api/users/"): (
+                "/api/users/",
+                {
+                    "email": "new-bench@example.com",
+                    "username": "new-bench",
+                    "first_name": "Bench",
+                    "last_name": "New",
+                    "password": PASSWORD,
+                },
+                None,
+            ),
+            ("GET", "/api/recipes/"): ("/api/recipes/?limit=6", None, None),
+            ("POST", "/api/recipes/"): (
+                "/api/recipes/",
+                self.recipe_body(),
+                None,
+            ),
+            ("GET", "/api/recipes/download_shopping_cart/"): (
+                "/api/recipes/download_shopping_cart/",
+                None,
+                None,
+            ),
+            ("GET", "/api/recipes/{id}/"): (
+                f"/api/recipes/{recipe}/",
+                None,
+                None,
+            ),
+            ("PATCH", "/api/recipes/{id}/"): (
+                f"/api/recipes/{own}/",
+                self.recipe_body(),
+                None,
+            ),
+            ("DELETE", "/api/recipes/{id}/"): (
+                f"/api/recipes/{own}/",
+                None,
+                None,
+            ),
+            ("GET", "/api/recipes/{id}/get-link/"): (
+                f"/api/recipes/{recipe}/get-link/",
+                None,
+                None,
+            ),
+            ("POST", "/api/recipes/{id}/favorite/"): (
+                f"/api/recipes/{recipe}/favorite/",
+                None,
+                relation(Favorite, False, **favorite),
+            ),
+            ("DELETE", "/api/recipes/{id}/favorite/"): (
+                f"/api/recipes/{recipe}/favorite/",
+                None,
+                relation(Favorite, True, **favorite),
+            ),
+            ("POST", "/api/recipes/{id}/shopping_cart/"): (
+                f"/api/recipes/{recipe}/shopping_cart/",
+                None,
+                relation(ShoppingCart, False, **favorite),
+            ),
+            ("DELETE", "/api/recipes/{id}/shopping_cart/"): (
+                f"/api/recipes/{recipe}/shopping_cart/",
+                None,
+                relation(ShoppingCart, True, **favorite),
+            ),
+            ("GET", "/api/users/{id}/"): (
+                f"/api/users/{author.pk}/",
+                None,
+                None,
+            ),
+            ("GET", "/api/users/me/"): ("/api/users/me/", None, None),
+            ("PUT", "/api/users/me/avatar/"): (
+                "/api/users/me/avatar/",
+                {"avatar": self.image},
+                None,
+            ),
+            ("DELETE", "/api/users/me/avatar/"): (
+                "/api/users/me/avatar/",
+                None,
+                None,
+            ),
+            ("GET", "/api/users/subscriptions/"): (
+                "/api/users/subscriptions/?recipes_limit=3",
+                None,
+                None,
+            ),
+            ("POST", "/api/users/{id}/subscribe/"): (
+                f"/api/users/{author.pk}/subscribe/",
+                None,
+                relation(Subscription, False, **subscription),
+            ),
+            ("DELETE", "/api/users/{id}/subscribe/"): (
+                f"/api/users/{author.pk}/subscribe/",
+                None,
+                relation(Subscription, True, **subscription),
+            ),
+            ("GET", "/api/ingredients/"): (
+                f"/api/ingredients/?name={quote(self.prefix)}",
+                None,
+                None,
+            ),
+            ("GET", "/api/ingredients/{id}/"): (
+                f"/api/ingredients/{self.ingredient_ids[0]}/",
+                None,
+                None,
+            ),
+            ("POST", "/api/users/set_password/"): (
+                "/api/users/set_password/",
+                {"current_password": PASSWORD, "new_password": PASSWORD},
+                None,
+            ),
+            ("POST", "/api/auth/token/login/"): (
+                "/api/auth/token/login/",
+                {"email": user.email, "password": PASSWORD},
+                None,
+            ),
+            ("POST", "/api/auth/token/logout/"): (
+                "/api/auth/token/logout/",
+                None,
+                None,
+            ),
+        }
+
+    def call(self, method, url, data):
+        path, _, query = url.partition("?")
+        body = json.dumps(data).encode() if data is not None else b""
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "HTTP_AUTHORIZATION": f"Token {self.token}",
+            "wsgi.input": io.BytesIO(body),
+        }
+        setup_testing_defaults(environ)
+        status = []
+        result = self.app(environ, lambda code, headers: status.append(code))
+        try:
+            size = sum(len(chunk) for chunk in result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return int(status[0].split()[0]), size
+
+    def measure(self, method, spec, options):
+        url, data, setup = spec
+        timings, queries, size, codes = [], 0, 0, set()
+        for i in range(options["warmup"] + options["requests"]):
+            with transaction.atomic():
+                if setup:
+                    setup()
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    code, size = self.call(method, url, data)
+                    elapsed = time.perf_counter() - started
+                transaction.set_rollback(True)
+            if i >= options["warmup"]:
+                timings.append(elapsed * 1000)
+                queries = max(queries, len(ctx))
+                codes.add(code)
+        return {
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+            "queries": queries,
+            "bytes": size,
+            "status": sorted(codes),
+        }
+
+    def compare(self, report, options):
+        baseline = json.loads(options["compare"].read_text(encoding="utf-8"))
+        regressions = []
+        for name, new in report["endpoints"].items():
+            old = baseline["endpoints"].get(name)
+            if old is None:
+                continue
+            ratio = new["p95_ms"] / old["p95_ms"] if old["p95_ms"] else 1
+            regressed = (
+                ratio > options["threshold"] or new["queries"] > old["queries"]
+            )
+            self.stdout.write(
+                f"{'!' if regressed else ' '} {name:45} "
+                f"p95 {old['p95_ms']:.2f} → {new['p95_ms']:.2f} мс "
+                f"(x{ratio:.2f}), queries {old['queries']} → "
+                f"{new['queries']}, bytes {old['bytes']} → {new['bytes']}"
+            )
+            if regressed:
+                regressions.append(name)
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"Регрессии: {', '.join(regressions)}")
@@ -0,0 +1,267 @@
+import asyncio
+import io
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from urllib.parse import quote
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from foodgram_backend.asgi import application
+from recipes.models import Ingredient, Recipe
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .benchmark_api import percentile
+from .generate_dataset import EMAIL_TEMPLATE
+
+HOST = "127.0.0.1"
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность горячих чтений (список и "
+        "карточка рецепта, get-link, поиск ингредиентов) под WSGI и ASGI "
+        "при --clients одновременных клиентах. По умолчанию оба "
+        "приложения вызываются в процессе: WSGI — пулом из --workers "
+        "потоков (как gunicorn -k gthread), ASGI — из event loop (как один "
+        "воркер uvicorn). С --wsgi-url/--asgi-url нагружаются запущенные "
+        "серверы"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=50)
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=20,
+            help="запросов на клиента",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="потоков WSGI-приложения в процессе",
+        )
+        parser.add_argument(
+            "--latency-ms",
+            type=float,
+            default=0.0,
+            help="добавить задержку к каждому SQL (удалённая СУБД)",
+        )
+        parser.add_argument("--wsgi-url", help="например http://web:8000")
+        parser.add_argument("--asgi-url", help="например http://asgi:8000")
+        parser.add_argument(
+            "--auth",
+            action="store_true",
+            help="с токеном пользователя generate_dataset",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        urls = self.urls(random.Random(options["seed"]))
+        headers = {"Host": HOST}
+        if options["auth"]:
+            headers["Authorization"] = f"Token {self.token()}"
+        if options["latency_ms"]:
+            self.slow_down(options["latency_ms"] / 1000)
+
+        results = {}
+        if options["wsgi_url"]:
+            results["WSGI"] = self.run_http(
+                options["wsgi_url"], urls, headers, options
+            )
+        else:
+            results["WSGI"] = self.run_wsgi(urls, headers, options)
+        if options["asgi_url"]:
+            results["ASGI"] = self.run_http(
+                options["asgi_url"], urls, headers, options
+            )
+        else:
+            results["ASGI"] = asyncio.run(
+                self.run_asgi(urls, headers, options)
+            )
+
+        for name, (timings, errors, elapsed) in results.items():
+            self.stdout.write(
+                f"{name}: {len(timings) / elapsed:8.1f} req/s  "
+                f"p50={percentile(timings, 50):8.2f} мс  "
+                f"p95={percentile(timings, 95):8.2f} мс  "
+                f"ошибок={errors}"
+            )
+        wsgi, asgi = (
+            len(results[name][0]) / results[name][2]
+            for name in ("WSGI", "ASGI")
+        )
+        self.stdout.write(f"ASGI / WSGI: x{asgi / wsgi:.2f}")
+
+    def urls(self, rnd):
+        ids = list(Recipe.objects.values_list("pk", flat=True)[:1000])
+        ingredient = Ingredient.objects.order_by("pk").first()
+        if not ids or ingredient is None:
+            raise CommandError(
+                "Нет набора данных — запустите generate_dataset"
+            )
+        recipe = rnd.choice(ids)
+        return [
+            "/api/recipes/?limit=10",
+            f"/api/recipes/{recipe}/",
+            f"/api/recipes/{recipe}/get-link/",
+            f"/api/ingredients/?name={quote(ingredient.name[:2])}",
+        ]
+
+    def token(self):
+        user = User.objects.filter(email=EMAIL_TEMPLATE.format(0)).first()
+        if user is None:
+            raise CommandError(
+                "Нет набора данных — запустите generate_dataset"
+            )
+        return Token.objects.get_or_create(user=user)[0].key
+
+    @staticmethod
+    def slow_down(seconds):
+        """Задержка каждого SQL во всех потоках, и в новых тоже."""
+
+        def sleepy(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            if sleepy not in connection.execute_wrappers:
+                connection.execute_wrappers.append(sleepy)
+
+        connection_created.connect(install, weak=False)
+        for connection in connections.all(initialized_only=True):
+            install(None, connection)
+
+    def run_clients(self, request, urls, options):
+        """--clients потоков по --requests запросов; (мс, ошибки, сек)."""
+        timings, errors, lock = [], [], threading.Lock()
+
+        def client(start):
+            pool = islice(cycle(urls), start, None)
+            for _ in range(options["requests"]):
+                started = time.perf_counter()
+                ok = request(next(pool))
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    timings.append(elapsed)
+                    errors.append(not ok)
+            connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options["clients"]) as executor:
+            list(executor.map(client, range(options["clients"])))
+        return timings, sum(errors), time.perf_counter() - started
+
+    def run_wsgi(self, urls, headers, options):
+        app = get_wsgi_application()
+        workers = threading.BoundedSemaphore(options["workers"])
+
+        def request(url):
+            path, _, query = url.partition("?")
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": path,
+                "QUERY_STRING": query,
+                "wsgi.input": io.BytesIO(),
+            }
+            for name, value in headers.items():
+                environ[f"HTTP_{name.upper()}"] = value
+            setup_testing_defaults(environ)
+            status = []
+            # клиент ждёт свободного воркера, как в очереди gunicorn
+            with workers:
+                result = app(environ, lambda code, _: status.append(code))
+                try:
+                    for _ in result:
+                        pass
+                finally:
+                    if hasattr(result, "close"):
+                        result.close()
+            return status[0].startswith("200")
+
+        for url in urls:
+            request(url)
+        return self.run_clients(request, urls, options)
+
+    async def run_asgi(self, urls, headers, options):
+        raw_headers = [
+            (name.lower().encode(), value.encode())
+            for name, value in headers.items()
+        ]
+
+        async def request(url):
+            path, _, query = url.partition("?")
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": query.encode(),
+                "root_path": "",
+                "headers": raw_headers,
+                "client": (HOST, 0),
+                "server": (HOST, 80),
+            }
+            body_sent = asyncio.Event()
+            statuses = []
+
+            async def receive():
+                if body_sent.is_set():
+                    # клиент не отключается, пока ответ не отдан
+                    await asyncio.Event().wait()
+                body_sent.set()
+                return {"type": "http.request", "body": b""}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    statuses.append(message["status"])
+
+            await application(scope, receive, send)
+            return statuses == [200]
+
+        timings, errors = [], 0
+
+        async def client(start):
+            nonlocal errors
+            pool = islice(cycle(urls), start, None)
+            for _ in range(options["requests"]):
+                started = time.perf_counter()
+                ok = await request(next(pool))
+                timings.append((time.perf_counter() - started) * 1000)
+                errors += not ok
+
+        for url in urls:
+            await request(url)
+        started = time.perf_counter()
+        await asyncio.gather(*map(client, range(options["clients"])))
+        return timings, errors, time.perf_counter() - started
+
+    def run_http(self, base, urls, headers, options):
+        base = base.rstrip("/")
+        # Host берётся из адреса сервера
+        headers = {k: v for k, v in headers.items() if k != "Host"}
+
+        def request(url):
+            try:
+                with urllib.request.urlopen(
+                    urllib.request.Request(base + url, headers=headers),
+                    timeout=30,
+                ) as response:
+                    response.read()
+                    return response.status == 200
+            except (urllib.error.URLError, OSError):
+                return False
+
+        return self.run_clients(request, urls, options)
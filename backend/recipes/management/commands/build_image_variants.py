@@ -0,0 +1,49 @@
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from recipes import images
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Строит уменьшенные копии для картинок рецептов и аватаров, "
+        "у которых их ещё нет (или они от прежней картинки)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None)
+
+    def handle(self, *args, **options):
+        with ProcessPoolExecutor(
+            max_workers=options["workers"],
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            for model, field_name in ((Recipe, "image"), (User, "avatar")):
+                # один файл может стоять у многих объектов — уменьшаем раз
+                sources = defaultdict(list)
+                for instance in (
+                    model.objects.exclude(**{field_name: ""})
+                    .exclude(**{f"{field_name}__isnull": True})
+                    .only("pk", field_name, images.variants_field(field_name))
+                    .iterator()
+                ):
+                    if images.is_stale(instance, field_name):
+                        sources[getattr(instance, field_name).name].append(
+                            instance.pk
+                        )
+                wait(
+                    [
+                        images.build(model, field_name, source, pks, executor)
+                        for source, pks in sources.items()
+                    ]
+                )
+                self.stdout.write(
+                    f"{model._meta.verbose_name_plural}: "
+                    f"{sum(map(len, sources.values()))} объектов, "
+                    f"{len(sources)} файлов"
+                )
+        self.stdout.write(self.style.SUCCESS("Готово"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from recipes import similarity
+
+
+class Command(BaseCommand):
+    help = (
+        "Считает похожие рецепты по совместному избранному: по умолчанию "
+        "только для рецептов, чьё избранное менялось с прошлого запуска"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="пересчитать все рецепты",
+        )
+        parser.add_argument("--top", type=int, default=similarity.TOP_N)
+        parser.add_argument(
+            "--block-size", type=int, default=similarity.BLOCK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        recipes, written = similarity.rebuild(
+            full=options["full"],
+            top=options["top"],
+            block_size=options["block_size"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Пересчитано рецептов: {recipes}, соседей: {written}"
+            )
+        )
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from recipes import trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает рейтинг «в тренде» по избранному и корзинам "
+        "с экспоненциальным затуханием; запускать периодически (cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--half-life",
+            type=float,
+            default=trending.HALF_LIFE / timedelta(hours=1),
+            help="период полураспада веса события, часов",
+        )
+
+    def handle(self, *args, **options):
+        recipes = trending.rebuild(
+            half_life=timedelta(hours=options["half_life"])
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Рецептов в рейтинге: {recipes}")
+        )
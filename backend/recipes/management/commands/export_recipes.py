@@ -0,0 +1,81 @@
+import json
+import pathlib
+import shutil
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+from recipes.models import Recipe, RecipeIngredient
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает рецепты в <dir>/recipes.jsonl (по рецепту на строку, "
+        "авторы по email, ингредиенты по названию) и картинки в <dir>/media"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", type=pathlib.Path)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        media = directory / "media"
+        media.mkdir(parents=True, exist_ok=True)
+        recipes = (
+            Recipe.objects.select_related("author")
+            .prefetch_related(
+                Prefetch(
+                    "recipe_ingredients",
+                    queryset=RecipeIngredient.objects.select_related(
+                        "ingredient"
+                    ),
+                )
+            )
+            .order_by("pk")
+            .iterator(chunk_size=options["chunk_size"])
+        )
+        exported = 0
+        with (directory / "recipes.jsonl").open("w", encoding="utf-8") as f:
+            for recipe in recipes:
+                f.write(json.dumps(self.serialize(recipe), ensure_ascii=False))
+                f.write("\n")
+                self.copy_image(recipe.image.name, media)
+                exported += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Выгружено рецептов: {exported} → {directory}")
+        )
+
+    @staticmethod
+    def serialize(recipe):
+        return {
+            "author": recipe.author.email,
+            "name": recipe.name,
+            "text": recipe.text,
+            "cooking_time": recipe.cooking_time,
+            "pub_date": recipe.pub_date.isoformat(),
+            "image": recipe.image.name,
+            "ingredients": [
+                {
+                    "name": item.ingredient.name,
+                    "measurement_unit": item.ingredient.measurement_unit,
+                    "amount": item.amount,
+                }
+                for item in recipe.recipe_ingredients.all()
+            ],
+        }
+
+    @staticmethod
+    def copy_image(name, media):
+        if not name:
+            return
+        target = media / name
+        if target.exists():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with default_storage.open(name, "rb") as src:
+                with target.open("wb") as dst:
+                    shutil.copyfileobj(src, dst)
+        except FileNotFoundError as error:
+            raise CommandError(f"Нет файла картинки: {name}") from error
@@ -0,0 +1,170 @@
+import io
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+from recipes import (
+    composition,
+    counters,
+    shopping_totals,
+    timeline,
+    trending,
+)
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from users.models import Subscription, User
+
+EMAIL_TEMPLATE = "bench{}@example.com"
+PASSWORD = "bench-password"
+IMAGE_NAME = "recipes/benchmark.png"
+BATCH_SIZE = 2000
+
+
+def ingredient_count(rnd):
+    """Логнормальное число ингредиентов: медиана ~7, хвост до 30."""
+    return max(1, min(30, round(rnd.lognormvariate(2.0, 0.45))))
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерирует воспроизводимый набор данных для нагрузочных замеров: "
+        "пользователи bench<N>@example.com, рецепты из реального "
+        "справочника, избранное, корзины и подписки"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=5000)
+        parser.add_argument("--favorites-per-user", type=int, default=20)
+        parser.add_argument("--carts-per-user", type=int, default=5)
+        parser.add_argument("--subscriptions-per-user", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="удалить ранее сгенерированных пользователей и их данные",
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        bench_users = User.objects.filter(
+            email__startswith="bench", email__endswith="@example.com"
+        )
+        if options["clear"]:
+            bench_users.delete()
+        elif bench_users.exists():
+            raise CommandError("Набор уже есть — запустите с --clear")
+        catalog = list(Ingredient.objects.values_list("id", flat=True))
+        if not catalog:
+            raise CommandError("Справочник пуст — сначала load_ingredients")
+        # популярность ингредиентов по закону Ципфа: соль чаще шафрана
+        rnd.shuffle(catalog)
+        weights = [1 / rank for rank in range(1, len(catalog) + 1)]
+
+        users = self.create_users(options["users"])
+        recipes = self.create_recipes(rnd, users, options["recipes"])
+        self.create_ingredients(rnd, recipes, catalog, weights)
+        for model, per_user in (
+            (Favorite, options["favorites_per_user"]),
+            (ShoppingCart, options["carts_per_user"]),
+        ):
+            model.objects.bulk_create(
+                (
+                    model(user=user, recipe=recipe)
+                    for user in users
+                    for recipe in rnd.sample(
+                        recipes, min(per_user, len(recipes))
+                    )
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        Subscription.objects.bulk_create(
+            (
+                Subscription(user=user, author=author)
+                for user in users
+                for author in rnd.sample(
+                    users, min(options["subscriptions_per_user"], len(users))
+                )
+                if author != user
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        # bulk_create обходит сигналы — досчитываем производные таблицы
+        counters.reconcile()
+        shopping_totals.rebuild()
+        composition.reset()
+        timeline.rebuild()
+        trending.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Создано: {len(users)} пользователей, {len(recipes)} "
+                f"рецептов; пароль {PASSWORD!r}"
+            )
+        )
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        return User.objects.bulk_create(
+            (
+                User(
+                    email=EMAIL_TEMPLATE.format(i),
+                    username=f"bench{i}",
+                    first_name="Bench",
+                    last_name=f"User{i}",
+                    password=password,
+                )
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+    def create_recipes(self, rnd, users, count):
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 64), "orange").save(buffer, "PNG")
+        # хранилище по хэшу: повторный запуск не пишет файл заново
+        image = default_storage.save(
+            IMAGE_NAME, ContentFile(buffer.getvalue())
+        )
+        return Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=rnd.choice(users),
+                    name=f"Рецепт №{i}",
+                    text="Сгенерированный рецепт для нагрузочных замеров.",
+                    image=image,
+                    cooking_time=rnd.randint(5, 180),
+                )
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+    def create_ingredients(self, rnd, recipes, catalog, weights):
+        def pick(k):
+            chosen = set()
+            while len(chosen) < min(k, len(catalog)):
+                chosen.update(rnd.choices(catalog, weights, k=k - len(chosen)))
+            return chosen
+
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=ingredient_id,
+                    amount=rnd.randint(1, 500),
+                )
+                for recipe in recipes
+                for ingredient_id in pick(ingredient_count(rnd))
+            ),
+            batch_size=BATCH_SIZE,
+        )
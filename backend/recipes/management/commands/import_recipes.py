@@ -0,0 +1,133 @@
+import json
+import pathlib
+from collections import Counter
+from itertools import islice
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from recipes import composition, counters, timeline
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает рецепты из <dir>/recipes.jsonl и <dir>/media "
+        "(формат export_recipes) пакетами bulk_create; рецепты, которые "
+        "у автора уже есть (по названию), пропускаются"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", type=pathlib.Path)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        path = directory / "recipes.jsonl"
+        if not path.exists():
+            raise CommandError(f"Файл не найден: {path}")
+        self.media = directory / "media"
+        # справочник небольшой — держим (название, единица) → id в памяти
+        self.ingredients = {
+            (name, unit): pk
+            for pk, name, unit in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit"
+            )
+        }
+        self.imported = 0
+        self.skipped = Counter()
+        with path.open(encoding="utf-8") as f:
+            rows = (json.loads(line) for line in f if line.strip())
+            while batch := list(islice(rows, options["batch_size"])):
+                self.import_batch(batch)
+        # пакеты шли без сигналов — индекс состава и ленты строим заново
+        composition.reset()
+        timeline.rebuild()
+        for reason, count in self.skipped.items():
+            self.stderr.write(f"Пропущено ({reason}): {count}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Загружено рецептов: {self.imported}")
+        )
+
+    @transaction.atomic
+    def import_batch(self, batch):
+        authors = dict(
+            User.objects.filter(
+                email__in={row["author"] for row in batch}
+            ).values_list("email", "id")
+        )
+        # повторный импорт того же файла не дублирует рецепты:
+        # ключ — автор и название
+        existing = set(
+            Recipe.objects.filter(
+                author_id__in=authors.values(),
+                name__in={row["name"] for row in batch},
+            ).values_list("author_id", "name")
+        )
+        recipes, items = [], []
+        for row in batch:
+            if row["author"] not in authors:
+                self.skipped["нет автора"] += 1
+                continue
+            key = (authors[row["author"]], row["name"])
+            if key in existing:
+                self.skipped["уже есть"] += 1
+                continue
+            amounts = [
+                (
+                    self.ingredients.get(
+                        (item["name"], item["measurement_unit"])
+                    ),
+                    item["amount"],
+                )
+                for item in row["ingredients"]
+            ]
+            if any(pk is None for pk, _ in amounts):
+                self.skipped["нет ингредиента"] += 1
+                continue
+            image = self.store_image(row["image"])
+            if image is None:
+                self.skipped["нет картинки"] += 1
+                continue
+            recipes.append(
+                Recipe(
+                    author_id=authors[row["author"]],
+                    name=row["name"],
+                    text=row["text"],
+                    cooking_time=row["cooking_time"],
+                    image=image,
+                    pub_date=parse_datetime(row["pub_date"]),
+                )
+            )
+            items.append(amounts)
+            existing.add(key)
+        pub_dates = [recipe.pub_date for recipe in recipes]
+        # bulk_create проставляет auto_now_add — возвращаем даты отдельно
+        Recipe.objects.bulk_create(recipes)
+        for recipe, pub_date in zip(recipes, pub_dates):
+            recipe.pub_date = pub_date
+        Recipe.objects.bulk_update(recipes, ["pub_date"])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=amount)
+            for recipe, amounts in zip(recipes, items)
+            for pk, amount in amounts
+        )
+        # bulk_create не отправляет сигналы — счётчики авторов вручную
+        for author_id, count in Counter(
+            recipe.author_id for recipe in recipes
+        ).items():
+            counters.increment(User, author_id, "recipes_count", count)
+        self.imported += len(recipes)
+
+    def store_image(self, name):
+        """Имя картинки в хранилище; None, если в <dir>/media её нет."""
+        source = self.media / name
+        if not name or not source.is_file():
+            return None
+        if default_storage.exists(name):
+            return name
+        with source.open("rb") as f:
+            return default_storage.save(name, File(f))
@@ -1,36 +1,134 @@
+import csv
+import hashlib
 import json
 import pathlib
+import time
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from recipes.models import Ingredient
+from recipes.catalog import bump_catalog_version
+from recipes.models import DataImport, Ingredient
+
+CHUNK_SIZE = 64 * 1024
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_json(path):
+    """Потоково читает JSON-массив объектов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    with path.open(encoding="utf-8") as f:
+        buffer, eof = "", False
+        while not buffer.lstrip().startswith("["):
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk or buffer.strip():
+                raise CommandError(f"{path}: ожидался JSON-массив")
+            buffer += chunk
+        buffer = buffer.lstrip()[1:]
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if buffer.startswith("]"):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(CHUNK_SIZE)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield item["name"], item["measurement_unit"]
+            buffer = buffer[end:]
+
+
+def iter_csv(path):
+    with path.open(encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            if row:
+                yield row[0], row[1]
+
+
+READERS = {".json": iter_json, ".csv": iter_csv}
 
 
 class Command(BaseCommand):
-    help = "Загружает ингредиенты из data/ingredients.json"
+    help = (
+        "Загружает ингредиенты из data/ingredients.json или .csv "
+        "пакетами; неизменённый файл пропускается по SHA-256"
+    )
 
-    def handle(self, *args, **options):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            type=pathlib.Path,
+            default=pathlib.Path(settings.BASE_DIR).parent
+            / "data"
+            / "ingredients.json",
+            help="файл .json или .csv",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="загрузить, даже если файл не менялся",
+        )
 
-        DATA_DIR = pathlib.Path(settings.BASE_DIR).parent / "data"
-        path = DATA_DIR / "ingredients.json"
+    def handle(self, *args, **options):
+        path = options["path"]
+        batch_size = options["batch_size"]
 
         if not path.exists():
             raise CommandError(f"Файл не найден: {path}")
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(f"Неизвестный формат: {path.suffix}")
 
-        with path.open(encoding="utf‑8") as f:
-            data = json.load(f)
-
-        created, skipped = 0, 0
-        for item in data:
-            obj, is_created = Ingredient.objects.get_or_create(
-                name=item["name"],
-                measurement_unit=item["measurement_unit"],
+        started = time.perf_counter()
+        checksum = file_checksum(path)
+        if (
+            not options["force"]
+            and DataImport.objects.filter(
+                source=path.name, checksum=checksum
+            ).exists()
+        ):
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{path.name} не изменился, пропущено за "
+                    f"{(time.perf_counter() - started) * 1000:.1f} мс"
+                )
             )
-            created += is_created
-            skipped += not is_created
+            return
+
+        before = Ingredient.objects.count()
+        rows, batch = 0, []
+        for name, unit in reader(path):
+            batch.append(Ingredient(name=name, measurement_unit=unit))
+            if len(batch) >= batch_size:
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                rows += len(batch)
+                batch = []
+        Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        rows += len(batch)
+        created = Ingredient.objects.count() - before
+
+        DataImport.objects.update_or_create(
+            source=path.name, defaults={"checksum": checksum}
+        )
+        # bulk_create не отправляет сигналы — сбрасываем индекс каталога
+        bump_catalog_version()
 
+        elapsed = time.perf_counter() - started
         self.stdout.write(
             self.style.SUCCESS(
-                f"Добавлено {created}, пропущено {skipped} (уже были)"
+                f"Добавлено {created}, пропущено {rows - created} (уже были); "
+                f"{rows} строк за {elapsed:.2f} с "
+                f"({rows / elapsed if elapsed else rows:.0f} строк/с)"
             )
         )
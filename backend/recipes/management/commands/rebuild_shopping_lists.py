@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes import shopping_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Перестраивает итоги списков покупок (ShoppingListItem) "
+        "из корзин и сверяет их с пересчётом"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify-only",
+            action="store_true",
+            help="только сверить таблицу, ничего не меняя",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify_only"]:
+            rows = shopping_totals.rebuild()
+            self.stdout.write(f"Записано строк: {rows}")
+
+        expected = shopping_totals.computed_totals()
+        stored = shopping_totals.stored_totals()
+        drift = {
+            key
+            for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        }
+        if drift:
+            for user_id, ingredient_id in sorted(drift)[:20]:
+                self.stderr.write(
+                    f"user={user_id} ingredient={ingredient_id}: "
+                    f"ожидалось {expected.get((user_id, ingredient_id))}, "
+                    f"в таблице {stored.get((user_id, ingredient_id))}"
+                )
+            raise CommandError(f"Расхождений: {len(drift)}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Итоги сходятся ({len(stored)} строк)")
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from recipes import timeline
+
+
+class Command(BaseCommand):
+    help = (
+        "Заново раскладывает последние рецепты авторов по лентам "
+        "подписчиков (после массовой загрузки или смены FANOUT_LIMIT)"
+    )
+
+    def handle(self, *args, **options):
+        rows = timeline.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Записей в лентах: {rows}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from recipes import counters
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики популярности и исправляет расхождения"
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile()
+        for counter, rows in fixed.items():
+            self.stdout.write(f"{counter}: исправлено {rows}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово, всего исправлено {sum(fixed.values())}"
+            )
+        )
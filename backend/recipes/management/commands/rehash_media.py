@@ -0,0 +1,147 @@
+import os
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from recipes import cache, images
+from recipes.models import Recipe
+from recipes.storage import is_hashed
+from users.models import User
+
+FIELDS = ((Recipe, "image"), (User, "avatar"))
+
+
+def referenced_names(model, field_name):
+    return (
+        model.objects.exclude(**{field_name: ""})
+        .exclude(**{f"{field_name}__isnull": True})
+        .values_list(field_name, flat=True)
+        .distinct()
+    )
+
+
+def walk(directory):
+    """Все файлы хранилища под directory, рекурсивно."""
+    if not default_storage.exists(directory):
+        return
+    directories, files = default_storage.listdir(directory)
+    for name in files:
+        yield os.path.join(directory, name)
+    for name in directories:
+        yield from walk(os.path.join(directory, name))
+
+
+class Command(BaseCommand):
+    help = (
+        "Переименовывает загруженные картинки в имена по sha256 "
+        "содержимого: одинаковые файлы сливаются в один, старые удаляются. "
+        "С --gc ещё удаляет файлы, на которые не ссылается ни один рецепт "
+        "или аватар (например, после DELETE /api/users/me/avatar/)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="только посчитать файлы со старыми именами",
+        )
+        parser.add_argument(
+            "--gc",
+            action="store_true",
+            help="удалить файлы без ссылок из БД и их уменьшенные копии",
+        )
+        parser.add_argument(
+            "--gc-min-age",
+            type=int,
+            default=60 * 60,
+            help=(
+                "не удалять файлы моложе стольких секунд: загрузка, "
+                "ещё не сохранённая в БД, выглядит как мусор"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        renamed = {}
+        for model, field_name in FIELDS:
+            for old in referenced_names(model, field_name).iterator():
+                if is_hashed(old):
+                    continue
+                if old not in renamed:
+                    if not default_storage.exists(old):
+                        self.stderr.write(f"Нет файла {old}, пропускаю")
+                        continue
+                    if options["dry_run"]:
+                        renamed[old] = old
+                        continue
+                    with default_storage.open(old) as file:
+                        renamed[old] = default_storage.save(old, file)
+                if not options["dry_run"]:
+                    self.relink(model, field_name, old, renamed[old])
+
+        if options["dry_run"]:
+            self.stdout.write(f"Файлов со старыми именами: {len(renamed)}")
+            if options["gc"]:
+                self.collect_garbage(options["gc_min_age"], dry_run=True)
+            return
+        # старые имена больше нигде не упоминаются
+        for old in renamed:
+            default_storage.delete(old)
+            for size in images.SIZES:
+                for extension in images.FORMATS:
+                    default_storage.delete(
+                        images.variant_name(old, size, extension)
+                    )
+        self.stdout.write(
+            f"Переименовано {len(renamed)} файлов в "
+            f"{len(set(renamed.values()))} уникальных"
+        )
+        # уменьшенные копии назывались по старым именам
+        call_command("build_image_variants", stdout=self.stdout)
+        if options["gc"]:
+            self.collect_garbage(options["gc_min_age"])
+
+    def collect_garbage(self, min_age, dry_run=False):
+        """
+        Удаляет файлы в каталогах upload_to, на которые не ссылается ни
+        одна запись: файл по хэшу делят несколько объектов, поэтому
+        замена и удаление картинки его не трогают.
+        """
+        referenced = set()
+        for model, field_name in FIELDS:
+            for name in referenced_names(model, field_name).iterator():
+                referenced.add(name)
+                referenced.update(
+                    images.variant_name(name, size, extension)
+                    for size in images.SIZES
+                    for extension in images.FORMATS
+                )
+        cutoff = timezone.now() - timedelta(seconds=min_age)
+        garbage = [
+            name
+            for model, field_name in FIELDS
+            for name in walk(model._meta.get_field(field_name).upload_to)
+            if name not in referenced
+            and default_storage.get_modified_time(name) < cutoff
+        ]
+        if not dry_run:
+            for name in garbage:
+                default_storage.delete(name)
+        self.stdout.write(f"Файлов без ссылок: {len(garbage)}")
+
+    @transaction.atomic
+    def relink(self, model, field_name, old, new):
+        pks = list(
+            model.objects.filter(**{field_name: old}).values_list(
+                "pk", flat=True
+            )
+        )
+        # update не шлёт сигналы — кэш фрагментов сбрасываем сами
+        model.objects.filter(pk__in=pks).update(**{field_name: new})
+        if model is User:
+            pks = Recipe.objects.filter(author__in=pks).values_list(
+                "pk", flat=True
+            )
+        cache.invalidate(list(pks))
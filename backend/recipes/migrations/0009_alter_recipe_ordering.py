@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-18 02:34
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0008_alter_favorite_user_alter_shoppingcart_user"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="recipe",
+            options={
+                "ordering": ("-pub_date", "-id"),
+                "verbose_name": "рецепт",
+                "verbose_name_plural": "рецепты",
+            },
+        ),
+    ]
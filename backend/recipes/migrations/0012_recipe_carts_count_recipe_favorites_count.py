@@ -0,0 +1,58 @@
+# Generated by Django 4.2.11 on 2026-10-18 02:43
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# (модель со счётчиком, поле, модель связи, FK на счётчик)
+COUNTERS = (
+    ("recipes", "Recipe", "favorites_count", "recipes", "Favorite", "recipe"),
+    ("recipes", "Recipe", "carts_count", "recipes", "ShoppingCart", "recipe"),
+    ("users", "User", "recipes_count", "recipes", "Recipe", "author"),
+    ("users", "User", "followers_count", "users", "Subscription", "author"),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app, model, field, rel_app, relation, fk in COUNTERS:
+        relation = apps.get_model(rel_app, relation)
+        apps.get_model(app, model).objects.update(
+            **{
+                field: Coalesce(
+                    Subquery(
+                        relation.objects.filter(**{fk: OuterRef("pk")})
+                        .order_by()
+                        .values(fk)
+                        .annotate(total=Count("pk"))
+                        .values("total")
+                    ),
+                    0,
+                )
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0011_shoppinglistitem"),
+        ("users", "0006_user_followers_count_user_recipes_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="carts_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="В корзинах, раз"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="В избранном, раз"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.11 on 2026-10-18 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0012_recipe_carts_count_recipe_favorites_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataImport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        max_length=200, unique=True, verbose_name="Файл"
+                    ),
+                ),
+                (
+                    "checksum",
+                    models.CharField(max_length=64, verbose_name="SHA-256"),
+                ),
+                (
+                    "loaded_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Загружен"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "загрузка данных",
+                "verbose_name_plural": "загрузки данных",
+            },
+        ),
+    ]
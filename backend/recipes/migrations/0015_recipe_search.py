@@ -0,0 +1,25 @@
+from django.db import migrations
+
+from recipes import search
+
+# DDL поискового индекса — в recipes/search.py: после пересборок таблицы
+# триггеры оттуда же возвращает post_migrate (search.restore).
+
+
+def install(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0014_recipe_image_variants"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0015_recipe_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompositionChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "recipe_id",
+                    models.BigIntegerField(null=True, verbose_name="Рецепт"),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True, db_index=True, verbose_name="Когда"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "изменение состава",
+                "verbose_name_plural": "изменения состава",
+            },
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0016_compositionchange"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FavoriteChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("recipe_id", models.BigIntegerField(verbose_name="Рецепт")),
+                (
+                    "user_id",
+                    models.BigIntegerField(verbose_name="Пользователь"),
+                ),
+            ],
+            options={
+                "verbose_name": "изменение избранного",
+                "verbose_name_plural": "изменения избранного",
+            },
+        ),
+        migrations.CreateModel(
+            name="SimilarRecipe",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField(verbose_name="Сходство")),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_entries",
+                        to="recipes.recipe",
+                        verbose_name="рецепт",
+                    ),
+                ),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_to",
+                        to="recipes.recipe",
+                        verbose_name="похожий рецепт",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "похожий рецепт",
+                "verbose_name_plural": "похожие рецепты",
+                "indexes": [
+                    models.Index(
+                        fields=["recipe", "-score"],
+                        name="similar_recipe_score_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="similarrecipe",
+            constraint=models.UniqueConstraint(
+                fields=("recipe", "similar"), name="unique_similar_recipe"
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:24
+
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# связи, добавленные до появления поля, получают время «неизвестно»:
+# полночь 1970-01-01 UTC, которую recipes.trending не учитывает
+UNKNOWN_CREATED = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0018_timelineentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingScore",
+            fields=[
+                (
+                    "recipe",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="trending",
+                        serialize=False,
+                        to="recipes.recipe",
+                        verbose_name="рецепт",
+                    ),
+                ),
+                ("score", models.FloatField(verbose_name="Рейтинг")),
+            ],
+            options={
+                "verbose_name": "рейтинг рецепта",
+                "verbose_name_plural": "рейтинги рецептов",
+            },
+        ),
+        migrations.AddField(
+            model_name="favorite",
+            name="created",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                default=UNKNOWN_CREATED,
+                verbose_name="Добавлено",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="shoppingcart",
+            name="created",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                default=UNKNOWN_CREATED,
+                verbose_name="Добавлено",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="favorite",
+            index=models.Index(
+                fields=["created"], name="favorite_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="shoppingcart",
+            index=models.Index(fields=["created"], name="cart_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="trendingscore",
+            index=models.Index(
+                fields=["-score", "-recipe"], name="trending_score_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+from recipes import name_index
+
+# DDL индекса — в recipes/name_index.py: после пересборок таблицы его
+# оттуда же возвращает post_migrate (name_index.restore).
+
+
+def install(apps, schema_editor):
+    name_index.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    name_index.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0019_trending"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
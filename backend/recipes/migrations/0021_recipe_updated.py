@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0020_ingredient_name_prefix_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="updated",
+            field=models.DateTimeField(auto_now=True, verbose_name="Изменён"),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0021_recipe_updated"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingredient",
+            name="updated",
+            field=models.DateTimeField(
+                auto_now=True, db_index=True, verbose_name="Изменён"
+            ),
+        ),
+    ]
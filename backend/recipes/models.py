@@ -1,7 +1,8 @@
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
-from users.models import User
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from users.models import Subscription, User
 
 from .constants import NAME_MAX_LENGTH, UNIT_MAX_LENGTH
 
@@ -11,6 +12,8 @@ class Ingredient(models.Model):
     measurement_unit = models.CharField(
         "Ед. измерения", max_length=UNIT_MAX_LENGTH
     )
+    # вместе с числом строк — версия каталога, см. recipes/catalog.py
+    updated = models.DateTimeField("Изменён", auto_now=True, db_index=True)
 
     class Meta:
         ordering = ("name",)
@@ -26,6 +29,47 @@ class Ingredient(models.Model):
         return f"{self.name} ({self.measurement_unit})"
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        План чтения для полного представления рецепта: автор — JOIN,
+        ингредиенты вместе со справочником — один дополнительный запрос.
+        """
+        return self.select_related("author").prefetch_related(
+            Prefetch(
+                "recipe_ingredients",
+                queryset=RecipeIngredient.objects.select_related("ingredient"),
+            )
+        )
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует флаги is_favorited, is_in_shopping_cart и
+        author_is_subscribed для пользователя одним запросом на страницу.
+        Для анонима флаги — константа False.
+        """
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                author_is_subscribed=false,
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            author_is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user, author=OuterRef("author")
+                )
+            ),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -35,6 +79,10 @@ class Recipe(models.Model):
     )
     name = models.CharField("Название", max_length=200)
     image = models.ImageField("Картинка", upload_to="recipes/")
+    # уменьшенные копии картинки, см. recipes/images.py
+    image_variants = models.JSONField(
+        "Размеры картинки", default=dict, blank=True, editable=False
+    )
     text = models.TextField("Описание")
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -47,9 +95,31 @@ class Recipe(models.Model):
         validators=[MinValueValidator(1)],
     )
     pub_date = models.DateTimeField("дата публикации", auto_now_add=True)
+    # версия кэшированного JSON рецепта, см. recipes/cache.py
+    updated = models.DateTimeField("Изменён", auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        "В избранном, раз", default=0, editable=False
+    )
+    carts_count = models.PositiveIntegerField(
+        "В корзинах, раз", default=0, editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ("-pub_date",)
+        # id — детерминированный тайбрейкер для одинаковых pub_date
+        ordering = ("-pub_date", "-id")
+        indexes = [
+            # лента и keyset-пагинация
+            models.Index(
+                fields=["-pub_date", "-id"], name="recipe_pub_date_idx"
+            ),
+            # рецепты автора (фильтр ?author= и подписки)
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="recipe_author_pub_date_idx",
+            ),
+        ]
         verbose_name = "рецепт"
         verbose_name_plural = "рецепты"
 
@@ -85,6 +155,13 @@ class RecipeIngredient(models.Model):
                 name="unique_recipe_ingredient",
             )
         ]
+        indexes = [
+            # покрывающий индекс для сборки списка покупок
+            models.Index(
+                fields=["recipe", "ingredient", "amount"],
+                name="recipe_ingredient_amount_idx",
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -103,6 +180,8 @@ class UserRecipeRelation(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE
     )
     recipe = models.ForeignKey("Recipe", on_delete=models.CASCADE)
+    # время события — для затухающего рейтинга (recipes.trending)
+    created = models.DateTimeField("Добавлено", auto_now_add=True)
 
     class Meta:
         abstract = True
@@ -126,6 +205,12 @@ class Favorite(UserRecipeRelation):
                 fields=["user", "recipe"], name="unique_favorite"
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["recipe", "user"], name="favorite_recipe_user_idx"
+            ),
+            models.Index(fields=["created"], name="favorite_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} ♥ {self.recipe}"
@@ -143,6 +228,215 @@ class ShoppingCart(UserRecipeRelation):
                 fields=["user", "recipe"], name="unique_shopping_cart"
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["recipe", "user"], name="cart_recipe_user_idx"
+            ),
+            models.Index(fields=["created"], name="cart_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} → {self.recipe}"
+
+
+class ShoppingListItem(models.Model):
+    """
+    Материализованный итог списка покупок: сколько ингредиента нужно
+    пользователю по всем рецептам из его корзины. Поддерживается
+    recipes.shopping_totals в тех же транзакциях, что и корзина.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name="пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name="ингредиент",
+    )
+    amount = models.PositiveIntegerField("Количество")
+
+    class Meta:
+        default_related_name = "shopping_list_items"
+        verbose_name = "позиция списка покупок"
+        verbose_name_plural = "позиции списков покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="unique_shopping_list_item",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.ingredient} — {self.amount}"
+
+
+class DataImport(models.Model):
+    """Отпечаток последнего загруженного файла данных (load_ingredients)."""
+
+    source = models.CharField("Файл", max_length=NAME_MAX_LENGTH, unique=True)
+    checksum = models.CharField("SHA-256", max_length=64)
+    loaded_at = models.DateTimeField("Загружен", auto_now=True)
+
+    class Meta:
+        verbose_name = "загрузка данных"
+        verbose_name_plural = "загрузки данных"
+
+    def __str__(self):
+        return f"{self.source} ({self.checksum[:12]})"
+
+
+class CompositionChange(models.Model):
+    """
+    Журнал изменений состава рецептов для обратного индекса
+    ингредиент → рецепты (recipes.composition). recipe_id = NULL —
+    массовая загрузка, индекс надо построить заново.
+    """
+
+    recipe_id = models.BigIntegerField("Рецепт", null=True)
+    created = models.DateTimeField("Когда", auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "изменение состава"
+        verbose_name_plural = "изменения состава"
+
+    def __str__(self):
+        return f"{self.recipe_id or 'все рецепты'} @ {self.created}"
+
+
+class SimilarRecipe(models.Model):
+    """
+    Сосед рецепта по избранному: «кто добавил этот рецепт, добавлял и
+    тот». Строится командой build_similar_recipes (recipes.similarity).
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="similar_entries",
+        verbose_name="рецепт",
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="similar_to",
+        verbose_name="похожий рецепт",
+    )
+    score = models.FloatField("Сходство")
+
+    class Meta:
+        verbose_name = "похожий рецепт"
+        verbose_name_plural = "похожие рецепты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipe", "similar"], name="unique_similar_recipe"
+            )
+        ]
+        indexes = [
+            # выдача соседей одного рецепта по убыванию сходства
+            models.Index(
+                fields=["recipe", "-score"], name="similar_recipe_score_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id} ~ {self.similar_id} ({self.score:.3f})"
+
+
+class FavoriteChange(models.Model):
+    """
+    Изменения избранного после последнего расчёта похожих рецептов:
+    build_similar_recipes пересчитает соседей рецепта и всего избранного
+    пользователя — пары с этим рецептом есть только там.
+    """
+
+    recipe_id = models.BigIntegerField("Рецепт")
+    user_id = models.BigIntegerField("Пользователь")
+
+    class Meta:
+        verbose_name = "изменение избранного"
+        verbose_name_plural = "изменения избранного"
+
+    def __str__(self):
+        return f"{self.user_id} ♥ {self.recipe_id}"
+
+
+class TimelineEntry(models.Model):
+    """
+    Рецепт в ленте подписчика (fan-out при записи, recipes.timeline).
+    Автор и дата публикации продублированы ради индексов: лента читается
+    по (user, -pub_date, -recipe), отписка чистит по (user, author).
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="подписчик",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="рецепт",
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="автор",
+    )
+    pub_date = models.DateTimeField("Дата публикации")
+
+    class Meta:
+        verbose_name = "запись ленты"
+        verbose_name_plural = "записи лент"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_timeline_entry"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-recipe"],
+                name="timeline_user_pub_date_idx",
+            ),
+            models.Index(
+                fields=["user", "author"], name="timeline_user_author_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.recipe_id}"
+
+
+class TrendingScore(models.Model):
+    """
+    Рейтинг «в тренде»: сумма добавлений в избранное и корзину с
+    экспоненциальным затуханием по возрасту. Пересчитывается
+    периодически командой compute_trending (recipes.trending).
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="trending",
+        verbose_name="рецепт",
+    )
+    score = models.FloatField("Рейтинг")
+
+    class Meta:
+        verbose_name = "рейтинг рецепта"
+        verbose_name_plural = "рейтинги рецептов"
+        indexes = [
+            # ?ordering=trending читает рецепты в порядке этого индекса
+            models.Index(
+                fields=["-score", "-recipe"], name="trending_score_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id}: {self.score:.3f}"
@@ -0,0 +1,46 @@
+"""
+Индекс по началу названия ингредиента (NameSearchFilter,
+name__istartswith).
+
+SQLite сводит LIKE 'x%' к диапазону только по индексу с NOCASE,
+PostgreSQL сравнивает UPPER(name::text) — нужен индекс по выражению.
+Ни то ни другое не описать одним Meta.indexes, поэтому индекс создаёт
+миграция 0020 через install(). Состояние миграций о нём не знает:
+пересборка recipes_ingredient в SQLite (AddField и т. п.) его удаляет,
+и restore() возвращает его после каждого migrate.
+"""
+
+from django.db.migrations.recorder import MigrationRecorder
+
+from .models import Ingredient
+
+MIGRATION = "0020_ingredient_name_prefix_idx"
+INDEX = "ingredient_name_prefix_idx"
+TABLE = Ingredient._meta.db_table
+INSTALL = {
+    "sqlite": f"CREATE INDEX IF NOT EXISTS {INDEX} "
+    f"ON {TABLE} (name COLLATE NOCASE)",
+    "postgresql": f"CREATE INDEX IF NOT EXISTS {INDEX} "
+    f"ON {TABLE} (UPPER(name::text) text_pattern_ops)",
+}
+
+
+def install(connection):
+    """Создаёт индекс; повторный вызов ничего не ломает."""
+    sql = INSTALL.get(connection.vendor)
+    if sql:
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+
+
+def uninstall(connection):
+    if connection.vendor in INSTALL:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX IF EXISTS {INDEX}")
+
+
+def restore(connection):
+    """После migrate: вернуть индекс, если его миграция применена."""
+    applied = MigrationRecorder(connection).applied_migrations()
+    if ("recipes", MIGRATION) in applied:
+        install(connection)
@@ -1,4 +1,9 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+
+from . import timeline
 from .constants import PAGE_SIZE
 
 
@@ -7,3 +12,145 @@ class LimitPageNumberPagination(PageNumberPagination):
     page_size = PAGE_SIZE
     # позволяем клиенту менять размер через параметр ?limit=
     page_size_query_param = "limit"
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация ленты рецептов по (-pub_date, -id):
+    без OFFSET и COUNT(*), курсоры next/previous непрозрачны.
+    Позиция в курсоре — та же, что у ленты подписок (timeline), поэтому
+    равные pub_date не ломают порядок ни в одну сторону.
+    """
+
+    page_size = PAGE_SIZE
+    page_size_query_param = "limit"
+    ordering = ("-pub_date", "-id")
+    invalid_ordering_message = (
+        "Курсор работает только с порядком по дате публикации; "
+        "для ?search= и ?ordering=trending используйте ?page=."
+    )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для async-view: страница — через async for."""
+        page_queryset = self.page_queryset(queryset, request)
+        return self.set_page([recipe async for recipe in page_queryset])
+
+    def page_queryset(self, queryset, request):
+        """Запрос страницы (на запись больше) без обращения к БД."""
+        # ?ordering=trending и ?search= сортируют по-своему (search_rank);
+        # пересортировка по дате потеряла бы их порядок — им нужны страницы
+        if queryset.query.order_by and (
+            tuple(queryset.query.order_by) != self.ordering
+        ):
+            raise ValidationError(
+                {self.cursor_query_param: [self.invalid_ordering_message]}
+            )
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        self.cursor = request.query_params.get(self.cursor_query_param)
+        self.reverse = False
+        if self.cursor:
+            try:
+                pub_date, pk, self.reverse = timeline.decode_position(
+                    self.cursor
+                )
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(
+                timeline.before(pub_date, pk, "pub_date", "id", self.reverse)
+            )
+            if self.reverse:
+                queryset = queryset.reverse()
+        # на лишнюю запись больше — узнать, есть ли что-то дальше
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, page):
+        has_more = len(page) > self.page_size
+        page = page[: self.page_size]
+        if self.reverse:
+            page.reverse()
+        self.has_next = has_more or self.reverse
+        self.has_previous = has_more if self.reverse else bool(self.cursor)
+        self.page = page
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return page
+
+    def link(self, recipe, reverse=False):
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            timeline.encode_cursor(recipe.pub_date, recipe.pk, reverse),
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.link(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.link(self.page[0], reverse=True)
+
+
+class RecipePagination(LimitPageNumberPagination):
+    """
+    По умолчанию — постраничная пагинация, как раньше.
+    Если в запросе есть ?cursor= (можно пустой для первой страницы),
+    включается keyset-режим RecipeCursorPagination.
+    """
+
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = RecipeCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset для async-view: COUNT через acount(), страница
+        через async for; ответ потом строит тот же get_paginated_response.
+        """
+        self.cursor_paginator = None
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = RecipeCursorPagination()
+            return await self.cursor_paginator.apaginate_queryset(
+                queryset, request, view
+            )
+        self.request = request
+        paginator = self.django_paginator_class(
+            queryset, self.get_page_size(request)
+        )
+        # Paginator.count — cached_property: подставляем готовое значение
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(
+                self.invalid_page_message.format(
+                    page_number=page_number, message=str(exc)
+                )
+            )
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.page.object_list = [
+            recipe async for recipe in self.page.object_list
+        ]
+        return self.page.object_list
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,177 @@
+"""
+Полнотекстовый поиск рецептов по названию и описанию.
+
+PostgreSQL: генерируемый столбец search_vector (название с весом A,
+описание — B) и GIN-индекс по нему, ранжирование ts_rank_cd.
+SQLite: внешняя FTS5-таблица поверх recipes_recipe, которую держат в
+актуальном состоянии триггеры, ранжирование bm25. DDL один: его
+применяет миграция 0015 через install()/uninstall(), а пересборка
+таблицы рецептов при миграциях SQLite удаляет триггеры, поэтому
+restore() повторяет install() после каждого migrate.
+"""
+
+import re
+
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+MIGRATION = "0015_recipe_search"
+CONFIG = "russian"
+TABLE = Recipe._meta.db_table
+FTS_TABLE = f"{TABLE}_fts"
+# вес названия относительно описания в bm25
+NAME_WEIGHT = 10.0
+WORD = re.compile(r"\w+")
+
+POSTGRES_INSTALL = (
+    f"""
+    ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{CONFIG}', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('{CONFIG}', coalesce(text, '')), 'B')
+    ) STORED
+    """,
+    f"""
+    CREATE INDEX IF NOT EXISTS recipe_search_vector_idx
+    ON {TABLE} USING GIN (search_vector)
+    """,
+)
+POSTGRES_UNINSTALL = (
+    "DROP INDEX IF EXISTS recipe_search_vector_idx",
+    f"ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector",
+)
+
+SQLITE_TABLE = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, text, content='{TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+SQLITE_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+)
+SQLITE_UNINSTALL = (
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+)
+
+
+def install(connection):
+    """Создаёт поисковый индекс; повторный вызов ничего не ломает."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for sql in POSTGRES_INSTALL:
+                cursor.execute(sql)
+        elif connection.vendor == "sqlite":
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master "
+                "WHERE type = 'trigger' AND tbl_name = %s AND name LIKE %s",
+                [TABLE, f"{FTS_TABLE}%"],
+            )
+            if cursor.fetchone()[0] == len(SQLITE_TRIGGERS):
+                return
+            cursor.execute(SQLITE_TABLE)
+            for sql in SQLITE_TRIGGERS:
+                cursor.execute(sql)
+            # пока триггеров не было, индекс мог отстать от таблицы
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+            )
+
+
+def restore(connection):
+    """После migrate: вернуть триггеры, если миграция индекса применена."""
+    applied = MigrationRecorder(connection).applied_migrations()
+    if ("recipes", MIGRATION) in applied:
+        install(connection)
+
+
+def uninstall(connection):
+    """Откат миграции 0015."""
+    statements = {
+        "postgresql": POSTGRES_UNINSTALL,
+        "sqlite": SQLITE_UNINSTALL,
+    }.get(connection.vendor, ())
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def fts5_query(value):
+    """Слова пользователя → FTS5-запрос: все слова, каждое по префиксу."""
+    return " ".join(f'"{word}"*' for word in WORD.findall(value))
+
+
+def search(queryset, value):
+    """
+    Оставляет рецепты, подходящие под value, и сортирует их по
+    релевантности (при равной — как обычно, свежие выше).
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        query = "websearch_to_tsquery(%s::regconfig, %s)"
+        queryset = queryset.filter(
+            RawSQL(
+                f"{TABLE}.search_vector @@ {query}",
+                (CONFIG, value),
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"ts_rank_cd({TABLE}.search_vector, {query})",
+                (CONFIG, value),
+                output_field=FloatField(),
+            )
+        )
+    elif vendor == "sqlite":
+        match = fts5_query(value)
+        if not match:
+            return queryset.none()
+        queryset = queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                (match,),
+            )
+        ).annotate(
+            # bm25 тем меньше, чем документ релевантнее; поиск по rowid
+            search_rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}, {NAME_WEIGHT}, 1.0) "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"AND {FTS_TABLE}.rowid = {TABLE}.id",
+                (match,),
+                output_field=FloatField(),
+            )
+        )
+    else:
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        )
+    return queryset.order_by("-search_rank", "-pub_date", "-id")
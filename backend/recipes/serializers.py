@@ -1,7 +1,10 @@
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from . import cache, composition, images, shopping_totals, timeline
 from .models import (
     Favorite,
     Ingredient,
@@ -25,8 +28,11 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
             )
         ]
 
+    @transaction.atomic
     def create(self, validated_data):
-        return ShoppingCart.objects.create(**validated_data)
+        cart = ShoppingCart.objects.create(**validated_data)
+        shopping_totals.add_recipe(cart.user_id, cart.recipe_id)
+        return cart
 
 
 class ShoppingCartDeleteSerializer(serializers.Serializer):
@@ -43,8 +49,11 @@ class ShoppingCartDeleteSerializer(serializers.Serializer):
             raise serializers.ValidationError("Рецепт не в корзине")
         return attrs
 
+    @transaction.atomic
     def save(self):
-        self.validated_data["instance"].delete()
+        instance = self.validated_data["instance"]
+        shopping_totals.remove_recipe(instance.user_id, instance.recipe_id)
+        instance.delete()
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -61,6 +70,7 @@ class FavoriteSerializer(serializers.ModelSerializer):
             )
         ]
 
+    @transaction.atomic
     def create(self, validated_data):
         return Favorite.objects.create(**validated_data)
 
@@ -77,6 +87,7 @@ class FavoriteDeleteSerializer(serializers.Serializer):
             raise serializers.ValidationError("Рецепт не в избранном")
         return attrs
 
+    @transaction.atomic
     def save(self):
         # удаляем найденный Favorite
         self.validated_data["instance"].delete()
@@ -102,9 +113,8 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(), source="ingredient"
-    )
+    # id разрешаются одним запросом в RecipeSerializer.validate
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -115,9 +125,43 @@ class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Короткое представление рецепта для подписок."""
 
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_variants", "cooking_time")
+
+    def get_image_variants(self, obj):
+        request = self.context.get("request")
+        return images.variant_urls(
+            obj.image,
+            obj.image_variants,
+            request.build_absolute_uri if request else str,
+        )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # карта размеров — только по ?variants=1
+        if not images.wants_variants(self.context):
+            del fields["image_variants"]
+        return fields
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Достаёт закэшированные фрагменты всей страницы одним get_many."""
+
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, "all") else data)
+        fragments = cache.get_fragments(recipes)
+        missing = {}
+        result = []
+        for recipe in recipes:
+            fragment = fragments.get(recipe.id)
+            if fragment is None:
+                fragment = missing[recipe] = self.child.build_fragment(recipe)
+            result.append(self.child.with_viewer_fields(recipe, fragment))
+        cache.set_fragments(missing)
+        return result
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -128,6 +172,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True, write_only=True, source="recipe_ingredients", required=False
     )
     image = Base64ImageField()
+    image_variants = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -142,15 +187,22 @@ class RecipeSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time",
+            "favorites_count",
+            "carts_count",
             "pub_date",
         )
+        list_serializer_class = RecipeListSerializer
         read_only_fields = (
             "id",
             "author",
+            "image_variants",
             "is_favorited",
             "is_in_shopping_cart",
+            "favorites_count",
+            "carts_count",
             "pub_date",
         )
 
@@ -168,28 +220,45 @@ class RecipeSerializer(serializers.ModelSerializer):
         return super().to_internal_value(data)
 
     def validate(self, attrs):
-        raw = self.initial_data.get("ingredients")
+        raw = attrs.get("recipe_ingredients")
         if raw is None:
             raise serializers.ValidationError(
                 {"ingredients": ["Это поле обязательно."]}
             )
-        if not isinstance(raw, list) or len(raw) == 0:
+        if not raw:
             raise serializers.ValidationError(
                 {"ingredients": ["Добавьте хотя бы один ингредиент."]}
             )
-        seen = set()
-        for ing in raw:
-            iid = ing.get("id")
-            if iid in seen:
-                raise serializers.ValidationError(
-                    {"ingredients": ["Ингредиенты должны быть уникальными."]}
-                )
-            seen.add(iid)
-            amt = ing.get("amount")
-            if amt is None or int(amt) < 1:
-                raise serializers.ValidationError(
-                    {"ingredients": ["Количество должно быть ≥ 1."]}
-                )
+        # при PATCH (partial) DRF не требует полей вложенных объектов
+        if any(not {"id", "amount"} <= ing.keys() for ing in raw):
+            raise serializers.ValidationError(
+                {"ingredients": ["Укажите id и amount каждого ингредиента."]}
+            )
+        ids = [ing["id"] for ing in raw]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                {"ingredients": ["Ингредиенты должны быть уникальными."]}
+            )
+        if any(ing["amount"] < 1 for ing in raw):
+            raise serializers.ValidationError(
+                {"ingredients": ["Количество должно быть ≥ 1."]}
+            )
+        # один запрос на весь список, а не по SELECT на ингредиент
+        found = Ingredient.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                {
+                    "ingredients": [
+                        f"Ингредиент с id={pk} не существует."
+                        for pk in missing
+                    ]
+                }
+            )
+        attrs["recipe_ingredients"] = [
+            {"ingredient": found[ing["id"]], "amount": ing["amount"]}
+            for ing in raw
+        ]
         ct = attrs.get("cooking_time")
         if ct is None or ct < 1:
             raise serializers.ValidationError(
@@ -198,17 +267,27 @@ class RecipeSerializer(serializers.ModelSerializer):
         return attrs
 
     def get_is_favorited(self, obj):
+        # значение уже посчитано в RecipeQuerySet.with_user_flags
+        annotated = getattr(obj, "is_favorited", None)
+        if annotated is not None:
+            return annotated
         user = self.context["request"].user
         if user.is_anonymous:
             return False
         return obj.favorited.filter(user=user).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        annotated = getattr(obj, "is_in_shopping_cart", None)
+        if annotated is not None:
+            return annotated
         user = self.context["request"].user
         if user.is_anonymous:
             return False
         return obj.in_carts.filter(user=user).exists()
 
+    def get_image_variants(self, obj):
+        return images.variant_urls(obj.image, obj.image_variants)
+
     def _create_ingredients(self, recipe, ingredients):
         objs = [
             RecipeIngredient(
@@ -219,7 +298,11 @@ class RecipeSerializer(serializers.ModelSerializer):
             for ing in ingredients
         ]
         RecipeIngredient.objects.bulk_create(objs)
+        # bulk_create не отправляет сигналы — сбрасываем кэш явно
+        cache.invalidate([recipe.id])
+        composition.changed([recipe.id])
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop("recipe_ingredients", [])
         # Привязываем текущего пользователя как автора
@@ -227,27 +310,130 @@ class RecipeSerializer(serializers.ModelSerializer):
             author=self.context["request"].user, **validated_data
         )
         self._create_ingredients(recipe, ingredients)
+        timeline.fan_out(recipe)
         return recipe
 
+    def _sync_ingredients(self, recipe, ingredients):
+        """
+        Приводит состав рецепта к ingredients по разнице с базой:
+        меняет количества, добавляет новые и удаляет лишние строки.
+        Неизменные строки не трогаются.
+        """
+        rows = {
+            row.ingredient_id: row
+            for row in recipe.recipe_ingredients.select_for_update()
+        }
+        old_amounts = {pk: row.amount for pk, row in rows.items()}
+        new_amounts = {
+            ing["ingredient"].id: ing["amount"] for ing in ingredients
+        }
+        changed = []
+        for pk, amount in new_amounts.items():
+            row = rows.get(pk)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        added = [
+            RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=amount)
+            for pk, amount in new_amounts.items()
+            if pk not in rows
+        ]
+        removed = [row.pk for pk, row in rows.items() if pk not in new_amounts]
+        if not (changed or added or removed):
+            return
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        RecipeIngredient.objects.bulk_update(changed, ["amount"])
+        RecipeIngredient.objects.bulk_create(added)
+        # bulk_update и bulk_create не отправляют сигналы
+        cache.invalidate([recipe.id])
+        shopping_totals.change_recipe(recipe.id, old_amounts, new_amounts)
+        if added or removed:
+            composition.changed([recipe.id])
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         if "recipe_ingredients" in validated_data:
-            instance.recipe_ingredients.all().delete()
-            self._create_ingredients(
+            self._sync_ingredients(
                 instance, validated_data.pop("recipe_ingredients")
             )
         return super().update(instance, validated_data)
 
-    def to_representation(self, instance):
-        rep = super().to_representation(instance)
+    def build_fragment(self, instance):
+        """
+        Часть ответа, не зависящая от зрителя: её можно кэшировать.
+        Ссылки на картинки хранятся относительными, флаги — пустыми.
+        """
         from users.serializers import UserSerializer
 
+        # после create/update состав не предзагружен: один запрос
+        # вместо SELECT справочника на каждый ингредиент
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                "recipe_ingredients",
+                queryset=RecipeIngredient.objects.select_related("ingredient"),
+            ),
+        )
+        rep = super().to_representation(instance)
+        rep["is_favorited"] = rep["is_in_shopping_cart"] = None
+        rep["image"] = instance.image.url if instance.image else ""
         # только автор остаётся «как есть»
-        rep["author"] = UserSerializer(
-            instance.author, context=self.context
-        ).data
-        if rep.get("image") is None:
-            rep["image"] = ""
+        author = instance.author
+        if hasattr(instance, "author_is_subscribed"):
+            author.is_subscribed = instance.author_is_subscribed
+        rep["author"] = dict(UserSerializer(author, context=self.context).data)
+        rep["author"]["avatar"] = author.avatar.url if author.avatar else None
+        rep["author"]["avatar_variants"] = images.variant_urls(
+            author.avatar, author.avatar_variants
+        )
+        rep["author"]["is_subscribed"] = None
         # удаляем из вывода поля, которых нет в responseSchema
         rep.pop("tags", None)
         rep.pop("pub_date", None)
         return rep
+
+    def with_viewer_fields(self, instance, fragment):
+        """Дополняет фрагмент флагами текущего пользователя."""
+        from users.serializers import UserSerializer
+
+        request = self.context.get("request")
+        absolute = request.build_absolute_uri if request else str
+        rep = dict(fragment)
+        rep["author"] = author = dict(fragment["author"])
+        rep["is_favorited"] = self.get_is_favorited(instance)
+        rep["is_in_shopping_cart"] = self.get_is_in_shopping_cart(instance)
+        # счётчики меняются чаще рецепта — берём их из строки, не из кэша
+        rep["favorites_count"] = instance.favorites_count
+        rep["carts_count"] = instance.carts_count
+        author["recipes_count"] = instance.author.recipes_count
+        author["followers_count"] = instance.author.followers_count
+        if rep["image"]:
+            rep["image"] = absolute(rep["image"])
+        if author["avatar"]:
+            author["avatar"] = absolute(author["avatar"])
+        if images.wants_variants(self.context):
+            rep["image_variants"] = images.absolutize(
+                rep["image_variants"], absolute
+            )
+            author["avatar_variants"] = images.absolutize(
+                author["avatar_variants"], absolute
+            )
+        else:
+            rep.pop("image_variants")
+            author.pop("avatar_variants")
+        # флаг подписки на автора приходит аннотацией к рецепту
+        if hasattr(instance, "author_is_subscribed"):
+            author["is_subscribed"] = instance.author_is_subscribed
+        else:
+            author["is_subscribed"] = UserSerializer(
+                context=self.context
+            ).get_is_subscribed(instance.author)
+        return rep
+
+    def to_representation(self, instance):
+        fragment = cache.get_fragments([instance]).get(instance.id)
+        if fragment is None:
+            fragment = self.build_fragment(instance)
+            cache.set_fragments({instance: fragment})
+        return self.with_viewer_fields(instance, fragment)
@@ -0,0 +1,59 @@
+"""
+Потоковая выгрузка списка покупок в txt, csv и json.
+
+Каждый writer принимает итератор строк вида
+``{"name": ..., "measurement_unit": ..., "total": ...}`` и отдаёт куски
+текста по одному на ингредиент, так что память не зависит от размера
+корзины.
+"""
+
+import csv
+import json
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def write_txt(items):
+    for item in items:
+        yield (
+            f"{item['name']} ({item['measurement_unit']}) — "
+            f"{item['total']}\n"
+        )
+
+
+def write_csv(items):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(("name", "measurement_unit", "amount"))
+    for item in items:
+        yield writer.writerow(
+            (item["name"], item["measurement_unit"], item["total"])
+        )
+
+
+def write_json(items):
+    separator = "["
+    for item in items:
+        yield separator + json.dumps(
+            {
+                "name": item["name"],
+                "measurement_unit": item["measurement_unit"],
+                "amount": item["total"],
+            },
+            ensure_ascii=False,
+        )
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+# формат → (content type, расширение файла, writer)
+FORMATS = {
+    "txt": ("text/plain; charset=utf-8", "txt", write_txt),
+    "csv": ("text/csv; charset=utf-8", "csv", write_csv),
+    "json": ("application/json", "json", write_json),
+}
+DEFAULT_FORMAT = "txt"
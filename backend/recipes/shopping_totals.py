@@ -0,0 +1,152 @@
+"""
+Поддержка таблицы ShoppingListItem.
+
+Каждое изменение корзины или состава рецепта превращается в набор
+приращений {ingredient_id: delta}, который применяется к строкам
+затронутых пользователей внутри текущей транзакции.
+"""
+
+from contextlib import ExitStack, contextmanager
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+BATCH_SIZE = 500
+
+
+def recipe_amounts(recipe_id):
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            "ingredient_id", "amount"
+        )
+    )
+
+
+def apply_deltas(user_ids, deltas):
+    """Прибавляет deltas к итогам каждого из user_ids."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    user_ids = list(user_ids)
+    if not deltas or not user_ids:
+        return
+    with transaction.atomic():
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            end = start + BATCH_SIZE
+            _apply_batch(user_ids[start:end], deltas)
+
+
+def _apply_batch(user_ids, deltas):
+    # сначала гарантируем строки, затем блокируем их и пересчитываем
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(user_id=user_id, ingredient_id=pk, amount=0)
+            for user_id in user_ids
+            for pk, delta in deltas.items()
+            if delta > 0
+        ),
+        ignore_conflicts=True,
+        batch_size=BATCH_SIZE,
+    )
+    items = list(
+        ShoppingListItem.objects.select_for_update().filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        )
+    )
+    for item in items:
+        item.amount = max(item.amount + deltas[item.ingredient_id], 0)
+    ShoppingListItem.objects.bulk_update(
+        [item for item in items if item.amount],
+        ["amount"],
+        batch_size=BATCH_SIZE,
+    )
+    ShoppingListItem.objects.filter(
+        pk__in=[item.pk for item in items if not item.amount]
+    ).delete()
+
+
+def add_recipe(user_id, recipe_id):
+    apply_deltas([user_id], recipe_amounts(recipe_id))
+
+
+def remove_recipe(user_id, recipe_id):
+    apply_deltas(
+        [user_id],
+        {pk: -amount for pk, amount in recipe_amounts(recipe_id).items()},
+    )
+
+
+def cart_user_ids(recipe_id):
+    return ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+        "user_id", flat=True
+    )
+
+
+def change_recipe(recipe_id, old_amounts, new_amounts):
+    """Переносит изменение состава рецепта во все корзины с ним."""
+    deltas = {
+        pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+        for pk in old_amounts.keys() | new_amounts.keys()
+    }
+    apply_deltas(cart_user_ids(recipe_id), deltas)
+
+
+@contextmanager
+def recipe_change(recipe_id):
+    """Переносит в корзины изменения состава, сделанные внутри блока."""
+    old_amounts = recipe_amounts(recipe_id)
+    yield
+    change_recipe(recipe_id, old_amounts, recipe_amounts(recipe_id))
+
+
+@contextmanager
+def recipes_change(recipe_ids):
+    with transaction.atomic(), ExitStack() as stack:
+        for recipe_id in set(recipe_ids):
+            stack.enter_context(recipe_change(recipe_id))
+        yield
+
+
+def computed_totals():
+    """Итоги, посчитанные заново из корзин: {(user_id, ingredient_id): n}."""
+    rows = (
+        RecipeIngredient.objects.filter(recipe__in_carts__isnull=False)
+        .values_list("recipe__in_carts__user", "ingredient")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    return {(user_id, pk): total for user_id, pk, total in rows.iterator()}
+
+
+def stored_totals():
+    rows = ShoppingListItem.objects.values_list(
+        "user_id", "ingredient_id", "amount"
+    )
+    return {(user_id, pk): amount for user_id, pk, amount in rows.iterator()}
+
+
+@transaction.atomic
+def rebuild():
+    """Перестраивает таблицу целиком; возвращает число строк."""
+    ShoppingListItem.objects.all().delete()
+    items = ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(user_id=user_id, ingredient_id=pk, amount=total)
+            for (user_id, pk), total in computed_totals().items()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    return len(items)
+
+
+def shopping_list(user):
+    """Строки для выгрузки: один индексированный запрос по user."""
+    return (
+        ShoppingListItem.objects.filter(user=user)
+        .values(
+            name=F("ingredient__name"),
+            measurement_unit=F("ingredient__measurement_unit"),
+            total=F("amount"),
+        )
+        .order_by("name", "measurement_unit")
+    )
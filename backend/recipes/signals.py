@@ -0,0 +1,146 @@
+from django.db import connections
+from django.db.models.signals import (
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from users.models import Subscription, User
+
+from . import (
+    cache,
+    catalog,
+    composition,
+    counters,
+    images,
+    name_index,
+    search,
+    shopping_totals,
+    similarity,
+)
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe(sender, instance, update_fields, **kwargs):
+    # save() сам сдвигает updated (auto_now), кроме save(update_fields=...)
+    if update_fields is not None and "updated" not in update_fields:
+        cache.invalidate([instance.pk])
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    # вызывается внутри транзакции удаления, до каскада корзин
+    shopping_totals.change_recipe(
+        instance.pk, shopping_totals.recipe_amounts(instance.pk), {}
+    )
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredient(sender, instance, **kwargs):
+    cache.invalidate([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_recipes(sender, instance, created, **kwargs):
+    # название и единица входят во фрагменты рецептов с ингредиентом
+    if not created:
+        cache.invalidate(
+            RecipeIngredient.objects.filter(ingredient=instance).values(
+                "recipe_id"
+            )
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_composition_index(sender, instance, **kwargs):
+    composition.changed([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_added(sender, instance, created, **kwargs):
+    # смена количества на подбор по составу не влияет
+    if created:
+        composition.changed([instance.recipe_id])
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_removed(sender, instance, **kwargs):
+    composition.changed([instance.recipe_id])
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        similarity.changed(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_removed(sender, instance, **kwargs):
+    similarity.changed(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(sender, instance, update_fields, **kwargs):
+    # вход в систему меняет только last_login — профиль автора тот же
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    cache.invalidate(
+        Recipe.objects.filter(author=instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def build_recipe_image_variants(sender, instance, **kwargs):
+    images.schedule(instance, "image")
+
+
+@receiver(post_save, sender=User)
+def build_avatar_variants(sender, instance, **kwargs):
+    images.schedule(instance, "avatar")
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_catalog(sender, **kwargs):
+    catalog.bump_catalog_version()
+
+
+@receiver(post_migrate)
+def restore_raw_indexes(sender, using, **kwargs):
+    # пересборка таблиц в SQLite удаляет триггеры FTS5 и индексы,
+    # созданные в обход состояния миграций
+    if sender.name == "recipes":
+        search.restore(connections[using])
+        name_index.restore(connections[using])
+
+
+# счётчики популярности: (модель связи, FK, модель со счётчиком, поле)
+COUNTED_RELATIONS = {
+    Favorite: ("recipe_id", Recipe, "favorites_count"),
+    ShoppingCart: ("recipe_id", Recipe, "carts_count"),
+    Recipe: ("author_id", User, "recipes_count"),
+    Subscription: ("author_id", User, "followers_count"),
+}
+
+
+def relation_created(sender, instance, created, **kwargs):
+    if created:
+        fk, model, field = COUNTED_RELATIONS[sender]
+        counters.increment(model, getattr(instance, fk), field)
+
+
+def relation_deleted(sender, instance, **kwargs):
+    fk, model, field = COUNTED_RELATIONS[sender]
+    counters.increment(model, getattr(instance, fk), field, -1)
+
+
+for relation in COUNTED_RELATIONS:
+    post_save.connect(relation_created, sender=relation)
+    post_delete.connect(relation_deleted, sender=relation)
@@ -0,0 +1,169 @@
+"""
+Похожие рецепты по совместному избранному (item-item).
+
+Матрица A — пользователи × рецепты из Favorite, сходство рецептов —
+косинус столбцов: |U_i ∩ U_j| / sqrt(|U_i| * |U_j|). Числители —
+строки разреженного произведения AᵀA (Counter на пересчитываемый
+рецепт). Рецепты идут блоками по block_size: для блока читается
+избранное только его пользователей, пачками по USER_CHUNK, внутри
+пачки — по пользователю; пары с рецептами блока сразу идут в счётчики.
+В памяти не больше block_size строк — блок записывается в своей
+транзакции и освобождается до следующего. Знаменатели берутся из
+array('I') числа добавлений, индексированного id рецепта.
+"""
+
+import heapq
+import math
+from array import array
+from collections import Counter
+from itertools import groupby, islice
+from operator import neg, truediv
+
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from .models import Favorite, FavoriteChange, Recipe, SimilarRecipe
+
+TOP_N = 20
+BLOCK_SIZE = 2000
+BATCH_SIZE = 5000
+USER_CHUNK = 1000
+# у «коллекционеров» тысячи рецептов: сигнала мало, пар — квадрат
+MAX_USER_FAVORITES = 1000
+
+
+def changed(user_id, recipe_id):
+    FavoriteChange.objects.create(user_id=user_id, recipe_id=recipe_id)
+
+
+def favorite_counts():
+    counts = array("I")
+    rows = (
+        Favorite.objects.order_by()
+        .values("recipe_id")
+        .annotate(total=Count("id"))
+        .values_list("recipe_id", "total")
+    )
+    for recipe_id, total in rows.iterator(chunk_size=BATCH_SIZE):
+        if recipe_id >= len(counts):
+            counts.extend([0] * (recipe_id + 1 - len(counts)))
+        counts[recipe_id] = total
+    return counts
+
+
+def chunks(values, size):
+    values = iter(values)
+    while chunk := list(islice(values, size)):
+        yield chunk
+
+
+def favorite_users(recipe_ids):
+    """Отсортированные id пользователей, добавлявших recipe_ids."""
+    return sorted(
+        Favorite.objects.filter(recipe__in=recipe_ids)
+        .order_by()
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+
+
+def cooccurrence(block):
+    """Строки AᵀA для рецептов блока: {рецепт: Counter(сосед → общих)}."""
+    rows = {pk: Counter() for pk in block}
+    for users in chunks(favorite_users(block), USER_CHUNK):
+        favorites = (
+            Favorite.objects.filter(user__in=users)
+            .order_by("user_id", "recipe_id")
+            .values_list("user_id", "recipe_id")
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+        for _, group in groupby(favorites, key=lambda row: row[0]):
+            favorite_ids = [recipe_id for _, recipe_id in group]
+            if len(favorite_ids) > MAX_USER_FAVORITES:
+                continue
+            for recipe_id in favorite_ids:
+                row = rows.get(recipe_id)
+                if row is not None:
+                    row.update(favorite_ids)
+    return rows
+
+
+def neighbours(pk, row, counts, top):
+    del row[pk]
+    if not row:
+        return []
+    others = list(row)
+    commons = list(row.values())
+    # избранное могли добавить между подсчётом и чтением пар
+    largest = max(pk, max(others))
+    if largest >= len(counts):
+        counts.extend([0] * (largest + 1 - len(counts)))
+    totals = map(max, map(counts.__getitem__, others), commons)
+    # общий для строки множитель 1 / sqrt(|U_pk|) на порядок не влияет
+    keys = map(truediv, commons, map(math.sqrt, totals))
+    best = heapq.nlargest(top, zip(keys, map(neg, others)))
+    norm = math.sqrt(max(counts[pk], max(commons)))
+    return [
+        SimilarRecipe(recipe_id=pk, similar_id=-other, score=key / norm)
+        for key, other in best
+    ]
+
+
+def stale(last):
+    """
+    Рецепты, чьи соседи устарели из-за изменений журнала до last:
+    сами изменённые, всё избранное их пользователей (пары с изменённым
+    рецептом) и рецепты, у которых изменённый уже в соседях (поменялся
+    знаменатель косинуса).
+    """
+    changes = FavoriteChange.objects.filter(id__lte=last)
+    changed_recipes = changes.values("recipe_id")
+    recipe_ids = Recipe.objects.filter(
+        Q(id__in=changed_recipes)
+        | Q(
+            id__in=Favorite.objects.filter(
+                user__in=changes.values("user_id")
+            ).values("recipe_id")
+        )
+        | Q(
+            id__in=SimilarRecipe.objects.filter(
+                similar__in=changed_recipes
+            ).values("recipe_id")
+        )
+    )
+    return list(recipe_ids.order_by("id").values_list("id", flat=True))
+
+
+@transaction.atomic
+def rebuild_block(block, rows, counts, top):
+    entries = []
+    for pk in block:
+        # строка больше не нужна — освобождаем память по ходу записи
+        row = rows.pop(pk)
+        if row:
+            entries.extend(neighbours(pk, row, counts, top))
+    SimilarRecipe.objects.filter(recipe__in=block).delete()
+    SimilarRecipe.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+    return len(entries)
+
+
+def rebuild(full=False, top=TOP_N, block_size=BLOCK_SIZE):
+    """
+    Пересчитывает соседей: всех рецептов при full или пустой таблице,
+    иначе — только устаревших после прошлого запуска (см. stale).
+    Возвращает (число рецептов, число записанных соседей).
+    """
+    # изменения после этой отметки дождутся следующего запуска
+    last = FavoriteChange.objects.aggregate(last=Max("id"))["last"] or 0
+    if full or not SimilarRecipe.objects.exists():
+        recipe_ids = list(
+            Recipe.objects.order_by("id").values_list("id", flat=True)
+        )
+    else:
+        recipe_ids = stale(last)
+    counts = favorite_counts()
+    written = 0
+    for block in chunks(recipe_ids, block_size):
+        written += rebuild_block(block, cooccurrence(block), counts, top)
+    FavoriteChange.objects.filter(id__lte=last).delete()
+    return len(recipe_ids), written
@@ -0,0 +1,75 @@
+"""
+Медиа с адресацией по содержимому.
+
+Файл называется sha256 своего содержимого в каталоге upload_to:
+recipes/<sha256>.png. Повторная загрузка той же картинки ничего не
+пишет, а один файл могут делить несколько рецептов и аватаров, поэтому
+удалять его при замене картинки нельзя — файлы, на которые больше
+никто не ссылается, удаляет manage.py rehash_media --gc. Содержимое по
+такому URL никогда не меняется — nginx отдаёт его с
+Cache-Control: immutable.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+
+def file_digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    directory, filename = os.path.split(name)
+    extension = os.path.splitext(filename)[1].lower()
+    return os.path.join(directory, f"{digest}{extension}")
+
+
+def is_hashed(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return bool(HASHED_NAME.match(stem))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        return super().save(
+            hashed_name(name, file_digest(content)), content, max_length
+        )
+
+    def get_available_name(self, name, max_length=None):
+        # одинаковое имя значит одинаковое содержимое
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # параллельная загрузка того же файла запишет те же байты,
+        # поэтому достаточно атомарной замены
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
@@ -1 +1,1552 @@
-# Create your tests here.
+import base64
+import io
+import json
+import math
+import os
+import pathlib
+import random
+import re
+import tempfile
+import threading
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    AsyncClient,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.client import AsyncClientHandler
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from users.models import Subscription, User
+
+from . import (
+    async_views,
+    cache,
+    catalog,
+    composition,
+    counters,
+    images,
+    name_index,
+    shopping_totals,
+    similarity,
+    storage,
+    timeline,
+    trending,
+)
+from .filters import NameSearchFilter
+from .management.commands import export_recipes, load_ingredients
+from .models import (
+    DataImport,
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    SimilarRecipe,
+    TimelineEntry,
+)
+from .views import IngredientViewSet, RecipeViewSet
+
+SEED = 42
+USERS = 200
+RECIPES = 3000
+INGREDIENTS = 500
+INGREDIENTS_PER_RECIPE = 6
+RELATIONS_PER_USER = 15
+
+# SQLite: «SCAN table» без «USING ... INDEX» (FTS5 идёт по своему
+# индексу: «VIRTUAL TABLE INDEX»); PostgreSQL: «Seq Scan on»
+SQLITE_SCAN = re.compile(
+    r"\bSCAN (?:TABLE )?(\w+)(?!.*\b(?:USING|VIRTUAL TABLE INDEX)\b)"
+)
+SQLITE_DERIVED = re.compile(r"\b(?:CO-ROUTINE|MATERIALIZE) (\w+)")
+POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def seed_dataset():
+    """Детерминированный набор данных, на котором планировщик
+    выбирает индексы, а не полный перебор маленьких таблиц."""
+    rnd = random.Random(SEED)
+    users = User.objects.bulk_create(
+        User(
+            email=f"user{i}@example.com",
+            username=f"user{i}",
+            first_name="Имя",
+            last_name="Фамилия",
+        )
+        for i in range(USERS)
+    )
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f"ингредиент {i:04d}", measurement_unit="г")
+        for i in range(INGREDIENTS)
+    )
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author=rnd.choice(users),
+            name=f"рецепт {i}",
+            image="recipes/seed.png",
+            text="текст",
+            cooking_time=rnd.randint(1, 120),
+        )
+        for i in range(RECIPES)
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+        for recipe in recipes
+        for ingredient in rnd.sample(ingredients, INGREDIENTS_PER_RECIPE)
+    )
+    for model in (Favorite, ShoppingCart):
+        model.objects.bulk_create(
+            model(user=user, recipe=recipe)
+            for user in users
+            for recipe in rnd.sample(recipes, RELATIONS_PER_USER)
+        )
+    Subscription.objects.bulk_create(
+        Subscription(user=user, author=author)
+        for user in users
+        for author in rnd.sample(users, RELATIONS_PER_USER)
+        if author != user
+    )
+    shopping_totals.rebuild()
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    return users, recipes
+
+
+class QueryPlanTests(TestCase):
+    """
+    Прогоняет горячие запросы recipes/views.py, recipes/filters.py и
+    users/serializers.py через API, снимает EXPLAIN с каждого SELECT
+    и падает, если где-то появился полный перебор таблицы.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.recipes = seed_dataset()
+        cls.user = cls.users[0]
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(f"EXPLAIN {sql}")
+                return "\n".join(row[0] for row in cursor.fetchall())
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return "\n".join(row[-1] for row in cursor.fetchall())
+
+    def seq_scans(self, plan):
+        if connection.vendor == "postgresql":
+            return POSTGRES_SCAN.findall(plan)
+        # производные таблицы (подзапросы) перебираются законно
+        derived = set(SQLITE_DERIVED.findall(plan))
+        return [
+            table
+            for line in plan.splitlines()
+            for table in SQLITE_SCAN.findall(line)
+            if table not in derived
+        ]
+
+    def assert_no_seq_scan(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+            if response.streaming:
+                # потоковый ответ выполняет запрос при чтении тела
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+        selects = [
+            query["sql"]
+            for query in ctx.captured_queries
+            if query["sql"].lstrip().upper().startswith("SELECT")
+        ]
+        self.assertTrue(selects, url)
+        for sql in selects:
+            plan = self.explain(sql)
+            self.assertEqual(
+                self.seq_scans(plan),
+                [],
+                f"{url}\n{sql}\n{plan}",
+            )
+
+    def test_recipe_list(self):
+        self.assert_no_seq_scan("/api/recipes/?limit=50")
+
+    def test_recipe_detail(self):
+        self.assert_no_seq_scan(f"/api/recipes/{self.recipes[0].id}/")
+
+    def test_recipe_filter_by_author(self):
+        self.assert_no_seq_scan(f"/api/recipes/?author={self.users[1].id}")
+
+    def test_recipe_filter_favorited(self):
+        self.assert_no_seq_scan("/api/recipes/?is_favorited=1")
+
+    def test_recipe_filter_in_shopping_cart(self):
+        self.assert_no_seq_scan("/api/recipes/?is_in_shopping_cart=1")
+
+    def test_recipe_search(self):
+        self.assert_no_seq_scan("/api/recipes/?search=рецепт 12&limit=10")
+
+    def test_similar_recipes(self):
+        similarity.rebuild(full=True)
+        self.assert_no_seq_scan(f"/api/recipes/{self.recipes[0].id}/similar/")
+
+    def test_feed(self):
+        timeline.rebuild()
+        response = self.client.get("/api/recipes/feed/?limit=5")
+        self.assertTrue(response.data["results"])
+        self.assert_no_seq_scan(response.data["next"])
+
+    def test_recipe_trending(self):
+        trending.rebuild()
+        self.assert_no_seq_scan("/api/recipes/?ordering=trending&limit=10")
+
+    def test_download_shopping_cart(self):
+        self.assert_no_seq_scan("/api/recipes/download_shopping_cart/")
+
+    def test_subscriptions(self):
+        self.assert_no_seq_scan("/api/users/subscriptions/?recipes_limit=3")
+
+    def assert_queryset_no_seq_scan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            sql = connection.ops.last_executed_query(cursor, sql, params)
+        plan = self.explain(sql)
+        self.assertEqual(self.seq_scans(plan), [], f"{sql}\n{plan}")
+
+    def test_favorite_count_by_recipe(self):
+        self.assert_queryset_no_seq_scan(
+            Favorite.objects.filter(recipe=self.recipes[0]).values("recipe")
+        )
+
+    def test_ingredient_name_search(self):
+        # ?name= вне списка (карточка, браузерный API) фильтрует в БД
+        request = Request(
+            RequestFactory().get("/", {"name": "ингредиент 001"})
+        )
+        queryset = NameSearchFilter().filter_queryset(
+            request, Ingredient.objects.all(), None
+        )
+        self.assertEqual(queryset.count(), 10)
+        self.assert_queryset_no_seq_scan(queryset)
+
+
+def create_recipe(author, ingredients, name="рецепт", amount=10):
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        image="recipes/seed.png",
+        text="текст",
+        cooking_time=10,
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+class RecipeFragmentCacheTests(TestCase):
+    """Правки рецепта, состава, автора и справочника видны сразу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email="author@example.com", username="author", first_name="Автор"
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name="соль", measurement_unit="г"
+        )
+        cls.recipe = create_recipe(cls.author, [cls.ingredient])
+        cls.url = f"/api/recipes/{cls.recipe.id}/"
+
+    def setUp(self):
+        caches[cache.CACHE_ALIAS].clear()
+        self.client = APIClient()
+        # фрагмент попадает в кэш
+        self.assertEqual(self.client.get(self.url).data["name"], "рецепт")
+
+    def test_recipe_update_through_api(self):
+        token = Token.objects.create(user=self.author)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        response = self.client.patch(
+            self.url,
+            {
+                "name": "новое название",
+                "cooking_time": 5,
+                "ingredients": [{"id": self.ingredient.id, "amount": 3}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        data = self.client.get(self.url).data
+        self.assertEqual(data["name"], "новое название")
+        self.assertEqual(data["ingredients"][0]["amount"], 3)
+
+    def test_recipe_ingredient_saved_directly(self):
+        row = RecipeIngredient.objects.get(recipe=self.recipe)
+        row.amount = 42
+        row.save()
+        data = self.client.get(self.url).data
+        self.assertEqual(data["ingredients"][0]["amount"], 42)
+
+    def test_author_profile_change(self):
+        self.author.first_name = "Переименован"
+        self.author.save()
+        data = self.client.get(self.url).data
+        self.assertEqual(data["author"]["first_name"], "Переименован")
+
+    def test_ingredient_rename(self):
+        self.ingredient.name = "морская соль"
+        self.ingredient.save()
+        data = self.client.get(self.url).data
+        self.assertEqual(data["ingredients"][0]["name"], "морская соль")
+
+    def test_fragment_built_before_commit_is_not_served(self):
+        # читатель прочёл строку до правки и пишет фрагмент после неё
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=self.recipe.pk).update(name="свежее")
+        cache.invalidate([self.recipe.pk])
+        cache.set_fragments({stale: {"name": "устаревшее"}})
+        self.assertEqual(self.client.get(self.url).data["name"], "свежее")
+
+
+class IngredientCatalogTests(TestCase):
+    """Индекс и готовый каталог следуют за версией каталога в БД."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.create(name="соль", measurement_unit="г")
+
+    def setUp(self):
+        self.client = APIClient()
+        catalog.bump_catalog_version()
+
+    def names(self, prefix):
+        response = self.client.get("/api/ingredients/", {"name": prefix})
+        return [item["name"] for item in response.json()]
+
+    def test_change_from_other_process(self):
+        self.assertEqual(self.names("со"), ["соль"])
+        etag = self.client.get("/api/ingredients/")["ETag"]
+        # как load_ingredients: bulk_create без сигналов в этом процессе
+        Ingredient.objects.bulk_create(
+            [Ingredient(name="соус", measurement_unit="мл")]
+        )
+        self.assertEqual(self.names("со"), ["соль"])
+        with mock.patch.object(catalog, "VERSION_TTL", 0):
+            self.assertEqual(self.names("со"), ["соль", "соус"])
+            response = self.client.get(
+                "/api/ingredients/", HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_change_in_this_process(self):
+        self.assertEqual(self.names("со"), ["соль"])
+        ingredient = Ingredient.objects.get()
+        ingredient.name = "сахар"
+        ingredient.save()
+        self.assertEqual(self.names("со"), [])
+        self.assertEqual(self.names("са"), ["сахар"])
+
+
+class ShoppingListExportTests(TestCase):
+    """Выгрузка списка покупок: итоги по ингредиентам во всех форматах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email="cook@example.com", username="cook"
+        )
+        salt = Ingredient.objects.create(name="соль", measurement_unit="г")
+        milk = Ingredient.objects.create(name="молоко", measurement_unit="мл")
+        cls.recipes = [
+            create_recipe(cls.user, [salt, milk], amount=10),
+            create_recipe(cls.user, [salt], amount=5),
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self):
+        for recipe in self.recipes:
+            response = self.client.post(
+                f"/api/recipes/{recipe.id}/shopping_cart/"
+            )
+            self.assertEqual(response.status_code, 201)
+
+    def download(self, fmt=None):
+        params = {"format": fmt} if fmt else {}
+        response = self.client.get(
+            "/api/recipes/download_shopping_cart/", params
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_txt_is_default(self):
+        self.fill_cart()
+        response, body = self.download()
+        self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        self.assertIn("shopping_list.txt", response["Content-Disposition"])
+        self.assertEqual(body, "молоко (мл) — 10\nсоль (г) — 15\n")
+
+    def test_csv(self):
+        self.fill_cart()
+        response, body = self.download("csv")
+        self.assertIn("shopping_list.csv", response["Content-Disposition"])
+        self.assertEqual(
+            body.splitlines(),
+            ["name,measurement_unit,amount", "молоко,мл,10", "соль,г,15"],
+        )
+
+    def test_json(self):
+        self.fill_cart()
+        response, body = self.download("json")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(
+            json.loads(body),
+            [
+                {"name": "молоко", "measurement_unit": "мл", "amount": 10},
+                {"name": "соль", "measurement_unit": "г", "amount": 15},
+            ],
+        )
+
+    def test_empty_cart_json(self):
+        _, body = self.download("json")
+        self.assertEqual(json.loads(body), [])
+
+    def test_unknown_format(self):
+        response = self.client.get(
+            "/api/recipes/download_shopping_cart/", {"format": "xml"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("format", response.json())
+
+
+class ShoppingTotalsAdminTests(TestCase):
+    """Правка состава рецепта в админке доходит до итогов корзин."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com", username="admin", password="pass"
+        )
+        cls.user = User.objects.create(
+            email="cook@example.com", username="cook"
+        )
+        cls.salt, cls.milk, cls.flour = (
+            Ingredient.objects.create(name=name, measurement_unit="г")
+            for name in ("соль", "молоко", "мука")
+        )
+        cls.recipe = create_recipe(cls.user, [cls.salt, cls.milk])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipe)
+        shopping_totals.rebuild()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assert_totals_match(self):
+        self.assertEqual(
+            shopping_totals.stored_totals(), shopping_totals.computed_totals()
+        )
+
+    def row(self, ingredient):
+        return RecipeIngredient.objects.get(
+            recipe=self.recipe, ingredient=ingredient
+        )
+
+    def test_change_row(self):
+        row = self.row(self.salt)
+        response = self.client.post(
+            f"/admin/recipes/recipeingredient/{row.pk}/change/",
+            {
+                "recipe": self.recipe.pk,
+                "ingredient": self.salt.pk,
+                "amount": 25,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            shopping_totals.stored_totals()[self.user.pk, self.salt.pk], 25
+        )
+        self.assert_totals_match()
+
+    def test_delete_row(self):
+        row = self.row(self.salt)
+        response = self.client.post(
+            f"/admin/recipes/recipeingredient/{row.pk}/delete/",
+            {"post": "yes"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(
+            (self.user.pk, self.salt.pk), shopping_totals.stored_totals()
+        )
+        self.assert_totals_match()
+
+    def test_recipe_inline(self):
+        salt, milk = self.row(self.salt), self.row(self.milk)
+        prefix = "recipe_ingredients"
+        response = self.client.post(
+            f"/admin/recipes/recipe/{self.recipe.pk}/change/",
+            {
+                "author": self.user.pk,
+                "name": self.recipe.name,
+                "text": self.recipe.text,
+                "cooking_time": self.recipe.cooking_time,
+                f"{prefix}-TOTAL_FORMS": 3,
+                f"{prefix}-INITIAL_FORMS": 2,
+                f"{prefix}-0-id": salt.pk,
+                f"{prefix}-0-recipe": self.recipe.pk,
+                f"{prefix}-0-ingredient": self.salt.pk,
+                f"{prefix}-0-amount": 40,
+                f"{prefix}-1-id": milk.pk,
+                f"{prefix}-1-recipe": self.recipe.pk,
+                f"{prefix}-1-ingredient": self.milk.pk,
+                f"{prefix}-1-amount": milk.amount,
+                f"{prefix}-1-DELETE": "on",
+                f"{prefix}-2-recipe": self.recipe.pk,
+                f"{prefix}-2-ingredient": self.flour.pk,
+                f"{prefix}-2-amount": 7,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            shopping_totals.stored_totals(),
+            {
+                (self.user.pk, self.salt.pk): 40,
+                (self.user.pk, self.flour.pk): 7,
+            },
+        )
+        self.assert_totals_match()
+
+
+class PopularityCounterTests(TestCase):
+    """Счётчики меняются вместе со связями, без рассинхронизации."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email="author@example.com", username="author"
+        )
+        cls.users = [
+            User.objects.create(
+                email=f"user{number}@example.com", username=f"user{number}"
+            )
+            for number in range(3)
+        ]
+        cls.recipe = create_recipe(cls.author, [])
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def counts(self):
+        self.recipe.refresh_from_db()
+        return self.recipe.favorites_count, self.recipe.carts_count
+
+    def test_favorites_and_carts(self):
+        for action in ("favorite", "shopping_cart"):
+            url = f"/api/recipes/{self.recipe.id}/{action}/"
+            for user in self.users:
+                self.assertEqual(
+                    self.client_for(user).post(url).status_code, 201
+                )
+            # повтор — 400, счётчик не растёт
+            self.assertEqual(
+                self.client_for(self.users[0]).post(url).status_code, 400
+            )
+        self.assertEqual(self.counts(), (3, 3))
+
+        for action in ("favorite", "shopping_cart"):
+            url = f"/api/recipes/{self.recipe.id}/{action}/"
+            self.assertEqual(
+                self.client_for(self.users[0]).delete(url).status_code, 204
+            )
+        self.assertEqual(self.counts(), (2, 2))
+        self.assertEqual(
+            set(counters.reconcile().values()), {0}, "счётчики разошлись"
+        )
+
+    def test_recipes_count(self):
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+        extra = create_recipe(self.author, [], name="второй")
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+
+        response = self.client_for(self.author).delete(
+            f"/api/recipes/{extra.id}/"
+        )
+        self.assertEqual(response.status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+        self.assertEqual(
+            set(counters.reconcile().values()), {0}, "счётчики разошлись"
+        )
+
+
+class LoadIngredientsTests(TestCase):
+    """load_ingredients пропускает файл с уже загруженной SHA-256."""
+
+    ITEMS = [
+        {"name": "соль", "measurement_unit": "г"},
+        {"name": "молоко", "measurement_unit": "мл"},
+        {"name": "мука", "measurement_unit": "г"},
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = pathlib.Path(directory.name) / "ingredients.json"
+        self.write(self.ITEMS)
+
+    def write(self, items):
+        self.path.write_text(json.dumps(items, ensure_ascii=False))
+
+    def load(self, *args):
+        out = io.StringIO()
+        call_command(
+            "load_ingredients", "--path", self.path, *args, stdout=out
+        )
+        return out.getvalue()
+
+    def test_unchanged_file_is_skipped(self):
+        self.assertIn("Добавлено 3", self.load())
+        self.assertIn("не изменился", self.load())
+        self.assertEqual(Ingredient.objects.count(), 3)
+        self.assertEqual(
+            DataImport.objects.get(source="ingredients.json").checksum,
+            load_ingredients.file_checksum(self.path),
+        )
+
+    def test_changed_file_is_loaded(self):
+        self.load()
+        self.write(self.ITEMS + [{"name": "яйцо", "measurement_unit": "шт"}])
+        self.assertIn("Добавлено 1, пропущено 3", self.load())
+        self.assertIn("не изменился", self.load())
+        self.assertEqual(Ingredient.objects.count(), 4)
+
+    def test_force(self):
+        self.load()
+        self.assertIn("Добавлено 0, пропущено 3", self.load("--force"))
+        self.assertEqual(Ingredient.objects.count(), 3)
+
+    def test_json_split_across_chunks(self):
+        with mock.patch.object(load_ingredients, "CHUNK_SIZE", 7):
+            self.load()
+        self.assertEqual(
+            set(Ingredient.objects.values_list("name", "measurement_unit")),
+            {(item["name"], item["measurement_unit"]) for item in self.ITEMS},
+        )
+
+
+class ImportRecipesTests(TestCase):
+    """Повторный import_recipes не дублирует рецепты."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email="author@example.com", username="author"
+        )
+        salt = Ingredient.objects.create(name="соль", measurement_unit="г")
+        create_recipe(cls.author, [salt], name="суп")
+        create_recipe(cls.author, [salt], name="каша")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = pathlib.Path(directory.name)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # формат export_recipes: recipes.jsonl и картинки в media/
+        image = self.directory / "media" / "recipes" / "seed.png"
+        image.parent.mkdir(parents=True)
+        image.write_bytes(b"seed")
+        with (self.directory / "recipes.jsonl").open("w") as f:
+            for recipe in Recipe.objects.order_by("pk"):
+                f.write(json.dumps(export_recipes.Command.serialize(recipe)))
+                f.write("\n")
+
+    def load(self):
+        out, err = io.StringIO(), io.StringIO()
+        call_command("import_recipes", self.directory, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_existing_recipes_are_skipped(self):
+        out, err = self.load()
+        self.assertIn("Загружено рецептов: 0", out)
+        self.assertIn("Пропущено (уже есть): 2", err)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_second_run_is_noop(self):
+        Recipe.objects.filter(name="суп").delete()
+        self.assertIn("Загружено рецептов: 1", self.load()[0])
+        self.assertIn("Загружено рецептов: 0", self.load()[0])
+        self.assertEqual(
+            sorted(Recipe.objects.values_list("name", flat=True)),
+            ["каша", "суп"],
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+
+    def test_missing_image_is_skipped(self):
+        Recipe.objects.all().delete()
+        (self.directory / "media" / "recipes" / "seed.png").unlink()
+        out, err = self.load()
+        self.assertIn("Загружено рецептов: 0", out)
+        self.assertIn("Пропущено (нет картинки): 2", err)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class RecipeIngredientSyncTests(TestCase):
+    """PATCH состава меняет только строки, которые действительно изменились."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email="author@example.com", username="author"
+        )
+        cls.salt, cls.milk, cls.flour, cls.egg = (
+            Ingredient.objects.create(name=name, measurement_unit="г")
+            for name in ("соль", "молоко", "мука", "яйцо")
+        )
+        cls.recipe = create_recipe(cls.author, [cls.salt, cls.milk, cls.flour])
+        ShoppingCart.objects.create(user=cls.author, recipe=cls.recipe)
+        shopping_totals.rebuild()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def rows(self):
+        return {
+            row.ingredient_id: (row.pk, row.amount)
+            for row in RecipeIngredient.objects.filter(recipe=self.recipe)
+        }
+
+    def patch(self, ingredients):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f"/api/recipes/{self.recipe.id}/",
+                {"cooking_time": 10, "ingredients": ingredients},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        return [
+            query["sql"]
+            for query in queries.captured_queries
+            if "recipes_recipeingredient" in query["sql"]
+            and not query["sql"].startswith("SELECT")
+        ]
+
+    def test_diff(self):
+        before = self.rows()
+        self.patch(
+            [
+                {"id": self.salt.id, "amount": 10},
+                {"id": self.milk.id, "amount": 25},
+                {"id": self.egg.id, "amount": 2},
+            ]
+        )
+        after = self.rows()
+        self.assertEqual(after[self.salt.id], before[self.salt.id])
+        # количество меняется в той же строке
+        self.assertEqual(after[self.milk.id], (before[self.milk.id][0], 25))
+        self.assertNotIn(self.flour.id, after)
+        self.assertEqual(after[self.egg.id][1], 2)
+        self.assertEqual(
+            shopping_totals.stored_totals(), shopping_totals.computed_totals()
+        )
+
+    def test_same_composition_writes_nothing(self):
+        before = self.rows()
+        writes = self.patch(
+            [
+                {"id": pk, "amount": amount}
+                for pk, (_, amount) in before.items()
+            ]
+        )
+        self.assertEqual(writes, [])
+        self.assertEqual(self.rows(), before)
+
+    def test_incomplete_ingredient(self):
+        before = self.rows()
+        for ingredient in ({"id": self.salt.id}, {"amount": 1}):
+            response = self.client.patch(
+                f"/api/recipes/{self.recipe.id}/",
+                {"cooking_time": 10, "ingredients": [ingredient]},
+                format="json",
+            )
+            self.assertEqual(response.status_code, 400, ingredient)
+            self.assertIn("ingredients", response.data)
+        self.assertEqual(self.rows(), before)
+
+
+class RecipeSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            email="author@example.com", username="author"
+        )
+        cls.in_name = create_recipe(author, [], name="Тыквенный суп")
+        cls.in_text = create_recipe(author, [], name="Рагу")
+        cls.in_text.text = "Подавать с тыквенными семечками"
+        cls.in_text.save()
+        create_recipe(author, [], name="Борщ")
+
+    def search(self, value):
+        response = self.client.get("/api/recipes/", {"search": value})
+        self.assertEqual(response.status_code, 200)
+        return [recipe["id"] for recipe in response.json()["results"]]
+
+    def test_name_ranks_above_text(self):
+        self.assertEqual(
+            self.search("тыквен"), [self.in_name.id, self.in_text.id]
+        )
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search("тыквенный суп"), [self.in_name.id])
+        self.assertEqual(self.search("тыквенный борщ"), [])
+
+    def test_cursor_keeps_rank_or_rejects(self):
+        response = self.client.get(
+            "/api/recipes/", {"search": "тыквен", "cursor": ""}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("cursor", response.json())
+        # без курсора поиск по-прежнему упорядочен по релевантности
+        response = self.client.get(
+            "/api/recipes/", {"search": "тыквен", "limit": 1, "page": 2}
+        )
+        self.assertEqual(
+            [recipe["id"] for recipe in response.json()["results"]],
+            [self.in_text.id],
+        )
+
+
+class CompositionIndexTests(TransactionTestCase):
+    """Индекс подбора по составу: правки по журналу и фоновая пересборка."""
+
+    def setUp(self):
+        # картинок рецептов нет, а on_commit здесь срабатывает
+        patcher = mock.patch.object(images, "schedule")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = User.objects.create(
+            email="author@example.com", username="author"
+        )
+        self.salt, self.milk, self.flour = (
+            Ingredient.objects.create(name=name, measurement_unit="г")
+            for name in ("соль", "молоко", "мука")
+        )
+        self.soup = create_recipe(self.author, [self.salt, self.milk])
+        self.index = composition.CompositionIndex()
+
+    def top(self):
+        return self.index.top([self.salt.id, self.milk.id], 10)
+
+    def test_journal_is_applied_to_a_new_snapshot(self):
+        self.assertEqual(self.top(), [(self.soup.id, 2, 2)])
+        before = self.index.snapshot
+        RecipeIngredient.objects.create(
+            recipe=self.soup, ingredient=self.flour, amount=1
+        )
+        self.assertEqual(self.top(), [(self.soup.id, 2, 3)])
+        self.assertIsNot(self.index.snapshot, before)
+        # старый снимок не изменился под читателями
+        self.assertEqual(before.sizes[self.soup.id], 2)
+        self.assertEqual(list(before.postings[self.salt.id]), [self.soup.id])
+
+    def test_rebuild_runs_in_background(self):
+        self.top()
+        # массовая загрузка без сигналов, как у import_recipes
+        salad = create_recipe(self.author, [self.salt])
+        composition.reset()
+        build, release = self.index._build, threading.Event()
+
+        def slow_build():
+            release.wait(timeout=10)
+            return build()
+
+        with mock.patch.object(self.index, "_build", slow_build):
+            # пока идёт пересборка, отвечает прежний снимок
+            self.assertEqual(self.top(), [(self.soup.id, 2, 2)])
+            self.assertEqual(self.top(), [(self.soup.id, 2, 2)])
+            release.set()
+            self.index.rebuild_thread.join(timeout=10)
+        self.assertEqual(self.top(), [(salad.id, 1, 1), (self.soup.id, 2, 2)])
+
+
+class SimilarityTests(TestCase):
+    """Похожие рецепты совпадают с косинусом, посчитанным в лоб."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(SEED)
+        author = User.objects.create(
+            email="author@example.com", username="author"
+        )
+        cls.recipes = [
+            create_recipe(author, [], name=f"рецепт {number}")
+            for number in range(40)
+        ]
+        for number in range(30):
+            user = User.objects.create(
+                email=f"user{number}@example.com", username=f"user{number}"
+            )
+            Favorite.objects.bulk_create(
+                Favorite(user=user, recipe=recipe)
+                for recipe in rnd.sample(cls.recipes, rnd.randint(1, 8))
+            )
+
+    def expected(self):
+        users = {}
+        for user_id, recipe_id in Favorite.objects.values_list(
+            "user_id", "recipe_id"
+        ):
+            users.setdefault(recipe_id, set()).add(user_id)
+        return {
+            (pk, other): len(users[pk] & users[other])
+            / math.sqrt(len(users[pk]) * len(users[other]))
+            for pk in users
+            for other in users
+            if pk != other and users[pk] & users[other]
+        }
+
+    def assert_matches_brute_force(self):
+        actual = {
+            (row.recipe_id, row.similar_id): row.score
+            for row in SimilarRecipe.objects.all()
+        }
+        expected = self.expected()
+        self.assertEqual(actual.keys(), expected.keys())
+        for pair, score in expected.items():
+            self.assertAlmostEqual(actual[pair], score)
+
+    def test_matches_brute_force(self):
+        blocks = []
+        rebuild_block = similarity.rebuild_block
+
+        def record(block, rows, counts, top):
+            blocks.append((list(block), len(rows)))
+            return rebuild_block(block, rows, counts, top)
+
+        with mock.patch.object(similarity, "USER_CHUNK", 7), mock.patch.object(
+            similarity, "rebuild_block", record
+        ), CaptureQueriesContext(connection) as queries:
+            similarity.rebuild(full=True, top=len(self.recipes), block_size=9)
+        self.assert_matches_brute_force()
+        # в памяти — строки только текущего блока
+        self.assertEqual(len(blocks), math.ceil(len(self.recipes) / 9))
+        self.assertEqual(
+            [rows for _, rows in blocks], [len(block) for block, _ in blocks]
+        )
+        self.assertLessEqual(max(rows for _, rows in blocks), 9)
+        # на блок — по запросу на пачку его пользователей
+        streams = [
+            query
+            for query in queries.captured_queries
+            if 'ORDER BY "recipes_favorite"."user_id"' in query["sql"]
+        ]
+        self.assertEqual(
+            len(streams),
+            sum(
+                math.ceil(len(similarity.favorite_users(block)) / 7)
+                for block, _ in blocks
+            ),
+        )
+
+    def test_incremental_matches_full(self):
+        similarity.rebuild(full=True, top=len(self.recipes))
+        user = User.objects.get(username="user0")
+        Favorite.objects.create(user=user, recipe=self.recipes[0])
+        Favorite.objects.filter(user__username="user1").delete()
+        similarity.rebuild(top=len(self.recipes))
+        self.assert_matches_brute_force()
+
+
+class FeedTests(TestCase):
+    """Лента подписок: раскладка нового рецепта, подписка и отписка."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(
+            email="reader@example.com", username="reader"
+        )
+        cls.author = User.objects.create(
+            email="author@example.com", username="author"
+        )
+        cls.other = User.objects.create(
+            email="other@example.com", username="other"
+        )
+        cls.salt = Ingredient.objects.create(name="соль", measurement_unit="г")
+        cls.recipes = [
+            create_recipe(cls.author, [cls.salt], name=f"рецепт {number}")
+            for number in range(3)
+        ]
+        cls.other_recipe = create_recipe(cls.other, [cls.salt])
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def feed(self):
+        response = self.client.get("/api/recipes/feed/")
+        self.assertEqual(response.status_code, 200)
+        return [recipe["id"] for recipe in response.data["results"]]
+
+    def subscribe(self, author, method="post"):
+        url = f"/api/users/{author.id}/subscribe/"
+        response = getattr(self.client, method)(url)
+        self.assertIn(response.status_code, (201, 204))
+
+    def newest_first(self, recipes):
+        return [
+            recipe.id
+            for recipe in sorted(
+                recipes, key=lambda recipe: (recipe.pub_date, recipe.id)
+            )
+        ][::-1]
+
+    def test_subscribe_backfills_feed(self):
+        self.assertEqual(self.feed(), [])
+        self.subscribe(self.author)
+        self.assertEqual(self.feed(), self.newest_first(self.recipes))
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+
+    def test_new_recipe_fans_out(self):
+        self.subscribe(self.author)
+        image = io.BytesIO()
+        Image.new("RGB", (1, 1)).save(image, "PNG")
+        author = APIClient()
+        author.force_authenticate(self.author)
+        response = author.post(
+            "/api/recipes/",
+            {
+                "name": "новый",
+                "text": "текст",
+                "cooking_time": 5,
+                "image": "data:image/png;base64,"
+                + base64.b64encode(image.getvalue()).decode(),
+                "ingredients": [{"id": self.salt.id, "amount": 1}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.feed()[0], response.data["id"])
+
+    def test_unsubscribe_prunes_only_that_author(self):
+        self.subscribe(self.author)
+        self.subscribe(self.other)
+        self.subscribe(self.author, "delete")
+        self.assertEqual(self.feed(), [self.other_recipe.id])
+        self.assertFalse(
+            TimelineEntry.objects.filter(
+                user=self.reader, author=self.author
+            ).exists()
+        )
+
+    def test_popular_author_is_pulled_on_read(self):
+        User.objects.filter(pk=self.author.pk).update(
+            followers_count=timeline.FANOUT_LIMIT + 1
+        )
+        self.subscribe(self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), self.newest_first(self.recipes))
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            email="author@example.com", username="author"
+        )
+        cls.fresh, cls.legacy = (
+            create_recipe(author, [], name=name)
+            for name in ("новый", "старый")
+        )
+        for number in range(3):
+            user = User.objects.create(
+                email=f"user{number}@example.com", username=f"user{number}"
+            )
+            Favorite.objects.create(user=user, recipe=cls.fresh)
+            Favorite.objects.create(user=user, recipe=cls.legacy)
+            ShoppingCart.objects.create(user=user, recipe=cls.legacy)
+        # связи из времён до поля created: так их датирует миграция 0019
+        unknown = import_module("recipes.migrations.0019_trending")
+        for model in (Favorite, ShoppingCart):
+            model.objects.filter(recipe=cls.legacy).update(
+                created=unknown.UNKNOWN_CREATED
+            )
+
+    def test_unknown_created_is_skipped(self):
+        totals = trending.scores()
+        self.assertEqual(set(totals), {self.fresh.id})
+        self.assertAlmostEqual(totals[self.fresh.id], 3, places=1)
+
+
+class ASGIRoutesClientHandler(AsyncClientHandler):
+    """Тестовый клиент с маршрутами ASGI_URLCONF, как у asgi.application."""
+
+    async def get_response_async(self, request):
+        request.urlconf = settings.ASGI_URLCONF
+        return await super().get_response_async(request)
+
+
+class AsyncViewParityTests(TestCase):
+    """Async-view под ASGI отвечают так же, как DRF-view под WSGI."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email="cook@example.com", username="cook"
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        salt = Ingredient.objects.create(name="соль", measurement_unit="г")
+        Ingredient.objects.create(name="сахар", measurement_unit="г")
+        cls.recipes = [
+            create_recipe(cls.user, [salt], name=f"рецепт {number}")
+            for number in range(5)
+        ]
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+
+    def setUp(self):
+        caches[cache.CACHE_ALIAS].clear()
+        self.asgi_client = AsyncClient()
+        self.asgi_client.handler = ASGIRoutesClientHandler()
+
+    def urls(self):
+        recipe = self.recipes[0].id
+        return [
+            "/api/recipes/",
+            "/api/recipes/?limit=2&page=2",
+            "/api/recipes/?limit=2&page=9",
+            "/api/recipes/?page=abc",
+            "/api/recipes/?cursor=&limit=2",
+            f"/api/recipes/?author={self.user.id}&is_favorited=1",
+            "/api/recipes/?author=abc",
+            f"/api/recipes/{recipe}/",
+            f"/api/recipes/{recipe}/?variants=1",
+            "/api/recipes/999999/",
+            f"/api/recipes/{recipe}/get-link/",
+            "/api/ingredients/?name=са",
+        ]
+
+    def assert_same(self, **headers):
+        for url in self.urls():
+            with self.subTest(url=url, headers=headers):
+                expected = self.client.get(url, headers=headers)
+                actual = async_to_sync(self.asgi_client.get)(
+                    url, headers=headers
+                )
+                self.assertEqual(actual.status_code, expected.status_code)
+                self.assertEqual(
+                    actual["Content-Type"], expected["Content-Type"]
+                )
+                # хлебные крошки браузерного API зависят от urlconf
+                if "html" not in actual["Content-Type"]:
+                    self.assertEqual(actual.content, expected.content)
+                    self.assertEqual(
+                        dict(actual.headers), dict(expected.headers)
+                    )
+
+    def test_anonymous(self):
+        self.assert_same()
+
+    def test_token(self):
+        self.assert_same(Authorization=f"Token {self.token.key}")
+
+    def test_jwt(self):
+        access = AccessToken.for_user(self.user)
+        self.assert_same(Authorization=f"Bearer {access}")
+
+    def test_bad_credentials(self):
+        self.assert_same(Authorization="Token invalid")
+        self.assert_same(Authorization="Bearer invalid")
+
+    def test_browsable_api_and_format(self):
+        self.assert_same(Accept="application/json; indent=4")
+        self.assert_same(Accept="text/html")
+
+    def test_hot_reads_skip_the_sync_view(self):
+        broken = mock.Mock(side_effect=AssertionError("синхронный view"))
+        with mock.patch.object(
+            RecipeViewSet, "list", broken
+        ), mock.patch.object(
+            RecipeViewSet, "retrieve", broken
+        ), mock.patch.object(
+            RecipeViewSet, "get_link", broken
+        ), mock.patch.object(
+            IngredientViewSet, "list", broken
+        ):
+            for url in self.urls()[:2] + self.urls()[7:9] + self.urls()[10:]:
+                response = async_to_sync(self.asgi_client.get)(url)
+                self.assertEqual(response.status_code, 200, url)
+
+    def test_list_thread_hops(self):
+        # sync_to_async самих async_views: initial() и сериализация;
+        # ?author= ещё проверяет автора запросом
+        hops = mock.Mock(wraps=async_views.sync_to_async)
+        for url, expected in (
+            ("/api/recipes/?limit=2&page=2", 2),
+            ("/api/recipes/?cursor=&limit=2", 2),
+            (f"/api/recipes/?author={self.user.id}", 3),
+        ):
+            with self.subTest(url=url), mock.patch.object(
+                async_views, "sync_to_async", hops
+            ):
+                hops.reset_mock()
+                response = async_to_sync(self.asgi_client.get)(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(hops.call_count, expected)
+
+
+class RecipeListQueryTests(TestCase):
+    """Число запросов страницы рецептов не растёт с её размером."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email="cook@example.com", username="cook"
+        )
+        cls.authors = [
+            User.objects.create(
+                email=f"author{number}@example.com",
+                username=f"author{number}",
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f"ингредиент {number}", measurement_unit="г"
+            )
+            for number in range(8)
+        ]
+        cls.recipes = [
+            create_recipe(
+                cls.authors[number % 3],
+                cls.ingredients[:1],
+                name=f"рецепт {number}",
+            )
+            for number in range(30)
+        ]
+        for recipe in cls.recipes[::2]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+        for recipe in cls.recipes[::3]:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscription.objects.create(user=cls.user, author=cls.authors[0])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def count_queries(self, limit):
+        # фрагменты из кэша прятали бы запросы за составом
+        caches[cache.CACHE_ALIAS].clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/recipes/", {"limit": limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), limit)
+        return len(queries), response.data["results"]
+
+    def test_user_flags(self):
+        self.client.force_authenticate(self.user)
+        favorited = set(
+            Favorite.objects.filter(user=self.user).values_list(
+                "recipe_id", flat=True
+            )
+        )
+        in_cart = set(
+            ShoppingCart.objects.filter(user=self.user).values_list(
+                "recipe_id", flat=True
+            )
+        )
+        counts = set()
+        for limit in (5, 25):
+            queries, results = self.count_queries(limit)
+            counts.add(queries)
+            for recipe in results:
+                self.assertEqual(
+                    recipe["is_favorited"], recipe["id"] in favorited
+                )
+                self.assertEqual(
+                    recipe["is_in_shopping_cart"], recipe["id"] in in_cart
+                )
+                self.assertEqual(
+                    recipe["author"]["is_subscribed"],
+                    recipe["author"]["id"] == self.authors[0].id,
+                )
+        self.assertEqual(len(counts), 1, counts)
+
+    def test_page_size_and_ingredients(self):
+        small, results = self.count_queries(5)
+        self.assertEqual({len(r["ingredients"]) for r in results}, {1})
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe in self.recipes
+            for ingredient in self.ingredients[1:]
+        )
+        large, results = self.count_queries(25)
+        self.assertEqual({len(r["ingredients"]) for r in results}, {8})
+        self.assertEqual(small, large)
+
+
+class RecipeCursorPaginationTests(TestCase):
+    """Keyset-режим ?cursor=: обход вперёд и назад по равным pub_date."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            email="author@example.com", username="author"
+        )
+        salt = Ingredient.objects.create(name="соль", measurement_unit="г")
+        recipes = [
+            create_recipe(author, [salt], name=f"рецепт {number}")
+            for number in range(11)
+        ]
+        # две «пачки» с одинаковым временем публикации
+        now = timezone.now()
+        Recipe.objects.filter(pk__in=[r.pk for r in recipes[:6]]).update(
+            pub_date=now
+        )
+        Recipe.objects.filter(pk__in=[r.pk for r in recipes[6:]]).update(
+            pub_date=now - timedelta(hours=1)
+        )
+        cls.expected = list(Recipe.objects.values_list("id", flat=True))
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([recipe["id"] for recipe in response.data["results"]])
+            url = response.data[link]
+        return pages
+
+    def test_next_then_previous(self):
+        forward = self.walk("/api/recipes/?cursor=&limit=3", "next")
+        self.assertEqual([len(page) for page in forward], [3, 3, 3, 2])
+        self.assertEqual(sum(forward, []), self.expected)
+        last = self.client.get("/api/recipes/?cursor=&limit=3")
+        while last.data["next"]:
+            last = self.client.get(last.data["next"])
+        backward = self.walk(last.data["previous"], "previous")
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/recipes/?cursor=abc")
+        self.assertEqual(response.status_code, 404)
+
+    def test_trending_rejects_cursor(self):
+        response = self.client.get("/api/recipes/?ordering=trending&cursor=")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("cursor", response.data)
+
+
+class NameIndexTests(TestCase):
+    """Индекс по началу названия переживает пересборки таблицы."""
+
+    def index_exists(self):
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(
+                cursor, name_index.TABLE
+            )
+        return name_index.INDEX in indexes
+
+    def test_restored_after_migrate(self):
+        if connection.vendor not in name_index.INSTALL:
+            self.skipTest("индекс только для SQLite и PostgreSQL")
+        # тестовая БД прошла 0022, которая в SQLite пересобирает таблицу
+        self.assertTrue(self.index_exists())
+        name_index.uninstall(connection)
+        self.assertFalse(self.index_exists())
+        name_index.restore(connection)
+        self.assertTrue(self.index_exists())
+
+
+class ImageVariantsTests(TestCase):
+    """Копии картинки без пула процессов (IMAGE_WORKERS=0)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email="author@example.com", username="author"
+        )
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = pathlib.Path(media.name)
+        settings = override_settings(MEDIA_ROOT=media.name, IMAGE_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def create_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.author,
+                name="рецепт",
+                image="recipes/photo.png",
+                text="текст",
+                cooking_time=10,
+            )
+        recipe.refresh_from_db()
+        return recipe
+
+    def test_variants_are_built_inline(self):
+        (self.media / "recipes").mkdir()
+        Image.new("RGB", (1200, 600), "red").save(
+            self.media / "recipes" / "photo.png"
+        )
+        recipe = self.create_recipe()
+        variants = recipe.image_variants
+        self.assertEqual(variants["source"], "recipes/photo.png")
+        with Image.open(self.media / variants["thumb"]["webp"]) as thumb:
+            self.assertEqual(thumb.size, (320, 160))
+
+    def test_missing_source_does_not_fail_save(self):
+        with self.assertLogs(images.logger, "ERROR"):
+            recipe = self.create_recipe()
+        self.assertEqual(recipe.image_variants, {})
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Медиа по sha256 содержимого и rehash_media."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email="author@example.com", username="author"
+        )
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = pathlib.Path(media.name)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def save(self, name, content=b"photo"):
+        return default_storage.save(name, ContentFile(content))
+
+    def test_same_bytes_same_name(self):
+        digest = storage.file_digest(ContentFile(b"photo"))
+        first = self.save("recipes/a.png")
+        self.assertEqual(first, f"recipes/{digest}.png")
+        with mock.patch.object(
+            storage.tempfile, "mkstemp", wraps=tempfile.mkstemp
+        ) as mkstemp:
+            self.assertEqual(self.save("recipes/b.png"), first)
+        mkstemp.assert_not_called()
+        self.assertEqual(os.listdir(self.media / "recipes"), [f"{digest}.png"])
+
+    def test_extension(self):
+        png = self.save("recipes/a.png")
+        # регистр расширения не создаёт копию, другое расширение — создаёт
+        self.assertEqual(self.save("recipes/a.PNG"), png)
+        jpeg = self.save("recipes/a.jpg")
+        self.assertNotEqual(jpeg, png)
+        self.assertEqual(os.path.splitext(jpeg)[0], os.path.splitext(png)[0])
+        self.assertNotEqual(self.save("recipes/c.png", b"other"), png)
+
+    def legacy(self, name, content=b"photo"):
+        # файл со старым именем, как до хэширования
+        FileSystemStorage(location=self.media).save(name, ContentFile(content))
+        return name
+
+    def rehash(self, *args):
+        out = io.StringIO()
+        with mock.patch(
+            "recipes.management.commands.rehash_media.call_command"
+        ):
+            call_command("rehash_media", *args, stdout=out)
+        return out.getvalue()
+
+    def test_rehash_relinks_and_invalidates(self):
+        old = create_recipe(self.author, [])
+        Recipe.objects.filter(pk=old.pk).update(
+            image=self.legacy("recipes/old.png")
+        )
+        copy = create_recipe(self.author, [])
+        Recipe.objects.filter(pk=copy.pk).update(
+            image=self.legacy("recipes/copy.png")
+        )
+        User.objects.filter(pk=self.author.pk).update(
+            avatar=self.legacy("avatars/me.png", b"avatar")
+        )
+        with mock.patch.object(cache, "invalidate") as invalidate:
+            out = self.rehash()
+        self.assertIn("Переименовано 3 файлов в 2 уникальных", out)
+        names = set(Recipe.objects.values_list("image", flat=True))
+        self.assertEqual(
+            names,
+            {f"recipes/{storage.file_digest(ContentFile(b'photo'))}.png"},
+        )
+        self.assertTrue(all(default_storage.exists(name) for name in names))
+        self.assertFalse(default_storage.exists("recipes/old.png"))
+        self.assertFalse(default_storage.exists("recipes/copy.png"))
+        self.author.refresh_from_db()
+        self.assertTrue(storage.is_hashed(self.author.avatar.name))
+        invalidated = {
+            pk for call in invalidate.call_args_list for pk in call.args[0]
+        }
+        self.assertEqual(invalidated, {old.pk, copy.pk})
+
+    def test_gc_removes_unreferenced_files(self):
+        recipe = create_recipe(self.author, [])
+        kept = self.save("recipes/kept.png")
+        Recipe.objects.filter(pk=recipe.pk).update(image=kept)
+        variant = images.variant_name(kept, "thumb", "webp")
+        orphan = self.save("recipes/orphan.png", b"orphan")
+        orphan_variant = images.variant_name(orphan, "thumb", "webp")
+        avatar = self.save("avatars/deleted.png", b"avatar")
+        # копии пишет images.render_variants мимо save()
+        for name in (variant, orphan_variant):
+            path = pathlib.Path(default_storage.path(name))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"variant")
+        fresh = self.save("recipes/fresh.png", b"fresh")
+        hour_ago = (timezone.now() - timedelta(hours=2)).timestamp()
+        for name in (kept, variant, orphan, orphan_variant, avatar):
+            os.utime(default_storage.path(name), (hour_ago, hour_ago))
+
+        self.assertIn("Файлов без ссылок: 3", self.rehash("--gc", "--dry-run"))
+        self.assertTrue(default_storage.exists(orphan))
+        self.assertIn("Файлов без ссылок: 3", self.rehash("--gc"))
+        for name in (kept, variant, fresh):
+            self.assertTrue(default_storage.exists(name), name)
+        for name in (orphan, orphan_variant, avatar):
+            self.assertFalse(default_storage.exists(name), name)
@@ -0,0 +1,167 @@
+"""
+Лента «новое от авторов, на которых я подписан».
+
+Новый рецепт сразу раскладывается по лентам подписчиков автора
+(TimelineEntry, пакетные INSERT), подписка досыпает в ленту последние
+рецепты автора, отписка их убирает. Лента читается одним индексным
+запросом по (user, -pub_date, -recipe) без перебора авторов.
+
+Авторы с подписчиками сверх FANOUT_LIMIT в ленты не раскладываются:
+их рецепты подмешиваются при чтении (fan-out on read) запросом по
+индексу (author, -pub_date, -id) и сливаются с лентой по тем же ключам.
+"""
+
+import base64
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Q
+from users.models import Subscription, User
+
+from .models import Recipe, TimelineEntry
+
+FANOUT_LIMIT = 10000
+# сколько последних рецептов автора попадает в ленту при подписке
+BACKFILL = 100
+BATCH_SIZE = 1000
+
+
+def is_pulled(author):
+    """Рецепты автора читаются при выдаче, а не раскладываются."""
+    return author.followers_count > FANOUT_LIMIT
+
+
+def entries(recipes, user_ids):
+    return (
+        TimelineEntry(
+            user_id=user_id,
+            recipe_id=recipe.id,
+            author_id=recipe.author_id,
+            pub_date=recipe.pub_date,
+        )
+        for user_id in user_ids
+        for recipe in recipes
+    )
+
+
+def fan_out(recipe):
+    """Кладёт новый рецепт в ленты подписчиков автора."""
+    if is_pulled(recipe.author):
+        return
+    followers = (
+        Subscription.objects.filter(author_id=recipe.author_id)
+        .values_list("user_id", flat=True)
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    TimelineEntry.objects.bulk_create(
+        entries([recipe], followers),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author):
+    """После подписки: последние рецепты автора — в ленту user_id."""
+    if is_pulled(author):
+        return
+    recipes = Recipe.objects.filter(author=author).only(
+        "id", "author_id", "pub_date"
+    )[:BACKFILL]
+    TimelineEntry.objects.bulk_create(
+        entries(recipes, [user_id]), ignore_conflicts=True
+    )
+
+
+def prune(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+@transaction.atomic
+def rebuild():
+    """Заново раскладывает рецепты по лентам (после массовой загрузки)."""
+    TimelineEntry.objects.all().delete()
+    authors = User.objects.filter(
+        id__in=Subscription.objects.values("author"),
+        followers_count__lte=FANOUT_LIMIT,
+    ).values_list("id", flat=True)
+    rows = 0
+    for author_id in list(authors):
+        recipes = list(
+            Recipe.objects.filter(author_id=author_id).only(
+                "id", "author_id", "pub_date"
+            )[:BACKFILL]
+        )
+        if not recipes:
+            continue
+        followers = Subscription.objects.filter(
+            author_id=author_id
+        ).values_list("user_id", flat=True)
+        rows += len(
+            TimelineEntry.objects.bulk_create(
+                entries(recipes, followers), batch_size=BATCH_SIZE
+            )
+        )
+    return rows
+
+
+def encode_cursor(pub_date, pk, reverse=False):
+    """reverse — курсор «назад»: страница перед позицией."""
+    fields = [pub_date.isoformat(), str(pk)] + (["r"] if reverse else [])
+    return base64.urlsafe_b64encode("|".join(fields).encode()).decode()
+
+
+def decode_position(cursor):
+    """(pub_date, id, назад ли) из курсора; испорченный — ValueError."""
+    position = base64.urlsafe_b64decode(cursor.encode()).decode()
+    pub_date, pk, *flags = position.split("|")
+    if flags not in ([], ["r"]):
+        raise ValueError(cursor)
+    return datetime.fromisoformat(pub_date), int(pk), bool(flags)
+
+
+def decode_cursor(cursor):
+    """(pub_date, id) из курсора ленты; испорченный курсор — ValueError."""
+    pub_date, pk, reverse = decode_position(cursor)
+    if reverse:
+        raise ValueError(cursor)
+    return pub_date, pk
+
+
+def before(pub_date, pk, date_field, id_field, reverse=False):
+    """
+    Строго после позиции (pub_date, pk) в порядке (-pub_date, -id),
+    с reverse — строго до неё.
+    """
+    lookup = "gt" if reverse else "lt"
+    return Q(**{f"{date_field}__{lookup}": pub_date}) | Q(
+        **{date_field: pub_date, f"{id_field}__{lookup}": pk}
+    )
+
+
+def page(user, limit, position=None):
+    """
+    Страница ленты: до limit пар (pub_date, recipe_id) от новых к старым
+    и признак, что дальше есть ещё.
+    """
+    pushed = TimelineEntry.objects.filter(user=user)
+    pulled = Recipe.objects.filter(
+        author__in=Subscription.objects.filter(
+            user=user, author__followers_count__gt=FANOUT_LIMIT
+        ).values("author")
+    )
+    if position is not None:
+        pushed = pushed.filter(before(*position, "pub_date", "recipe_id"))
+        pulled = pulled.filter(before(*position, "pub_date", "id"))
+    # на лишнюю запись больше — узнать, есть ли следующая страница
+    size = limit + 1
+    keys = set(
+        pushed.order_by("-pub_date", "-recipe_id").values_list(
+            "pub_date", "recipe_id"
+        )[:size]
+    )
+    pulled_keys = pulled.order_by("-pub_date", "-id").values_list(
+        "pub_date", "id"
+    )
+    keys.update(pulled_keys[:size])
+    keys = sorted(keys, reverse=True)
+    return keys[:limit], len(keys) > limit
@@ -0,0 +1,67 @@
+"""
+Рейтинг «в тренде».
+
+Каждое добавление в избранное или корзину даёт рецепту вес, который
+затухает экспоненциально: weight * 2 ** (-возраст / HALF_LIFE).
+События старше WINDOW периодов полураспада (вес < 1%) не читаются.
+Считается пакетно: БД отдаёт число событий на (рецепт, час), вес часа
+берётся по его середине, итог целиком заменяет таблицу TrendingScore.
+Связи, добавленные до появления времени события, миграция 0019
+датировала 1970-01-01 — далеко за окном, в рейтинг они не входят.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Favorite, ShoppingCart, TrendingScore
+
+HALF_LIFE = timedelta(hours=24)
+WINDOW = 7
+# добавление в корзину — намерение приготовить, но слабее избранного
+WEIGHTS = ((Favorite, 1.0), (ShoppingCart, 0.5))
+BATCH_SIZE = 5000
+
+
+def scores(now=None, half_life=HALF_LIFE):
+    """{recipe_id: затухающий рейтинг} на момент now."""
+    now = now or timezone.now()
+    since = now - WINDOW * half_life
+    # середина текущего часа может быть ещё впереди
+    middle = timedelta(minutes=30)
+    totals = defaultdict(float)
+    for model, weight in WEIGHTS:
+        hours = (
+            model.objects.filter(created__gte=since)
+            .annotate(hour=TruncHour("created"))
+            .order_by()
+            .values_list("recipe_id", "hour")
+            .annotate(events=Count("id"))
+        )
+        for recipe_id, hour, events in hours.iterator(chunk_size=BATCH_SIZE):
+            age = max(now - hour - middle, timedelta(0))
+            totals[recipe_id] += weight * events * 0.5 ** (age / half_life)
+    return totals
+
+
+@transaction.atomic
+def rebuild(now=None, half_life=HALF_LIFE):
+    """Заменяет рейтинг целиком; возвращает число рецептов в нём."""
+    totals = scores(now, half_life)
+    TrendingScore.objects.all().delete()
+    TrendingScore.objects.bulk_create(
+        (
+            TrendingScore(recipe_id=recipe_id, score=score)
+            for recipe_id, score in totals.items()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    # таблица заменена целиком — статистика планировщика устарела
+    with connection.cursor() as cursor:
+        table = connection.ops.quote_name(TrendingScore._meta.db_table)
+        cursor.execute(f"ANALYZE {table}")
+    return len(totals)
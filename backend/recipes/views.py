@@ -1,14 +1,35 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+import re
+
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
+from . import shopping_list, shopping_totals, similarity, timeline
+from .catalog import catalog_response, ingredient_index
+from .composition import composition_index
+from .constants import (
+    BY_INGREDIENTS_MAX_LIMIT,
+    FEED_MAX_LIMIT,
+    PAGE_SIZE,
+    SHOPPING_LIST_CHUNK_SIZE,
+)
 from .filters import NameSearchFilter, RecipeFilter
-from .models import Ingredient, Recipe, RecipeIngredient
+from .models import Ingredient, Recipe
+from .pagination import RecipePagination
 from .permissions import IsAuthor
 from .serializers import (
     FavoriteDeleteSerializer,
@@ -25,8 +46,9 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API-endpoint для просмотра ингредиентов.
 
-    Поиск по началу названия выполняется кастомным фильтром `NameSearchFilter`,
-    поэтому дополнительный `search_fields` не нужен.
+    Поиск по началу названия (`?name=`) в списке обслуживает
+    `ingredient_index` в памяти процесса; `NameSearchFilter` задаёт имя
+    параметра и фильтрует queryset в остальных действиях.
     """
 
     queryset = Ingredient.objects.all()
@@ -35,17 +57,59 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (NameSearchFilter,)  # поиск по началу названия
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        # автодополнение отвечает из индекса в памяти, без запроса к БД
+        name = request.query_params.get(NameSearchFilter.search_param)
+        if name:
+            return Response(ingredient_index.search(name))
+        if request.accepted_renderer.format == "json":
+            return self._catalog_response(request)
+        return super().list(request, *args, **kwargs)
+
+    @staticmethod
+    def _catalog_response(request):
+        """Готовый сжатый каталог с ETag: 304, если у клиента он есть."""
+        etag, variants = catalog_response.get()
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        else:
+            accept = request.headers.get("Accept-Encoding", "")
+            encoding = next(
+                (
+                    coding
+                    for coding in ("br", "gzip")
+                    if coding in variants
+                    and re.search(rf"\b{coding}\b", accept)
+                ),
+                "identity",
+            )
+            response = HttpResponse(
+                variants[encoding], content_type="application/json"
+            )
+            if encoding != "identity":
+                response["Content-Encoding"] = encoding
+        response["ETag"] = etag
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
 
-    queryset = Recipe.objects.all().order_by("-pub_date")
+    queryset = Recipe.objects.all().order_by("-pub_date", "-id")
     serializer_class = RecipeSerializer
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
     def get_permissions(self):
         # создание, избранное и корзина — любой залогиненный
-        if self.action in ("create", "favorite", "shopping_cart"):
+        if self.action in (
+            "create",
+            "favorite",
+            "shopping_cart",
+            "download_shopping_cart",
+            "feed",
+        ):
             return [IsAuthenticated()]
         # редактирование или удаление — только автор
         if self.action in ("update", "partial_update", "destroy"):
@@ -53,6 +117,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
         # остальное — открытое
         return [AllowAny()]
 
+    def get_queryset(self):
+        # флаги текущего пользователя считаются подзапросами EXISTS
+        # на всю страницу сразу, а не отдельным запросом на каждый рецепт
+        return (
+            super()
+            .get_queryset()
+            .with_related()
+            .with_user_flags(self.request.user)
+        )
+
     @action(
         detail=True,
         methods=("get",),
@@ -70,6 +144,122 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         return Response({"short-link": link}, status=status.HTTP_200_OK)
 
+    @staticmethod
+    def _limit(request, default, maximum):
+        limit = request.query_params.get("limit", str(default))
+        if not limit.isdecimal() or int(limit) < 1:
+            raise ValidationError(
+                {"limit": ["Должно быть целым положительным числом."]}
+            )
+        return min(int(limit), maximum)
+
+    @action(
+        detail=True,
+        methods=("get",),
+        permission_classes=(AllowAny,),
+    )
+    def similar(self, request, pk=None):
+        """
+        «Добавившие этот рецепт в избранное добавляли и эти»: соседи,
+        заранее посчитанные build_similar_recipes, — одно чтение по
+        индексу (recipe, -score).
+        """
+        if not pk.isdecimal():
+            raise Http404
+        limit = self._limit(request, PAGE_SIZE, similarity.TOP_N)
+        recipes = list(
+            Recipe.objects.filter(similar_to__recipe_id=pk).order_by(
+                "-similar_to__score", "id"
+            )[:limit]
+        )
+        # пустой ответ — либо нет соседей, либо нет самого рецепта
+        if not recipes:
+            get_object_or_404(Recipe, pk=pk)
+        return Response(
+            RecipeShortSerializer(
+                recipes, many=True, context={"request": request}
+            ).data
+        )
+
+    @action(
+        detail=False, methods=("get",), permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        """
+        Новые рецепты авторов из подписок, от свежих к старым.
+        Keyset-пагинация: ссылка next несёт позицию последнего рецепта.
+        """
+        cursor = request.query_params.get("cursor")
+        try:
+            position = timeline.decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise NotFound("Неверный курсор.")
+        keys, has_next = timeline.page(
+            request.user,
+            self._limit(request, PAGE_SIZE, FEED_MAX_LIMIT),
+            position,
+        )
+        recipes = self.get_queryset().in_bulk([pk for _, pk in keys])
+        next_url = None
+        if has_next:
+            next_url = replace_query_param(
+                request.build_absolute_uri(),
+                "cursor",
+                timeline.encode_cursor(*keys[-1]),
+            )
+        return Response(
+            {
+                "next": next_url,
+                "results": self.get_serializer(
+                    [recipes[pk] for _, pk in keys if pk in recipes],
+                    many=True,
+                ).data,
+            }
+        )
+
+    @action(
+        detail=False,
+        methods=("get",),
+        url_path="by-ingredients",
+        permission_classes=(AllowAny,),
+    )
+    def by_ingredients(self, request):
+        """
+        Что приготовить из имеющегося: ?ids=1,2,3 (или ids=1&ids=2).
+        Рецепты по убыванию доли ингредиентов, которые уже есть,
+        при равной доле — с меньшим числом недостающих.
+        """
+        values = [
+            value
+            for param in request.query_params.getlist("ids")
+            for value in param.split(",")
+            if value.strip()
+        ]
+        if not values or not all(
+            value.strip().isdecimal() for value in values
+        ):
+            raise ValidationError(
+                {"ids": ["Укажите id ингредиентов через запятую."]}
+            )
+        ranked = composition_index.top(
+            [int(value) for value in values],
+            self._limit(request, PAGE_SIZE, BY_INGREDIENTS_MAX_LIMIT),
+        )
+        recipes = self.get_queryset().in_bulk([pk for pk, _, _ in ranked])
+        results = []
+        for pk, matched, total in ranked:
+            # рецепт могли удалить после обновления индекса
+            if pk not in recipes:
+                continue
+            data = RecipeShortSerializer(
+                recipes[pk], context={"request": request}
+            ).data
+            data["matched"] = matched
+            data["missing"] = total - matched
+            data["coverage"] = round(matched / total, 3)
+            results.append(data)
+        return Response(results)
+
     def _toggle_relation(
         self, request, serializer_class, delete_serializer_class
     ):
@@ -116,27 +306,35 @@ class RecipeViewSet(viewsets.ModelViewSet):
             request, ShoppingCartSerializer, ShoppingCartDeleteSerializer
         )
 
+    def perform_content_negotiation(self, request, force=False):
+        # в выгрузке ?format= выбирает формат файла, а не рендерер DRF
+        if self.action == "download_shopping_cart":
+            force = True
+        return super().perform_content_negotiation(request, force)
+
     @action(
         detail=False, methods=("get",), permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request):
-        user = request.user
-        qs = (
-            RecipeIngredient.objects.filter(recipe__in_carts__user=user)
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(total=Sum("amount"))
-        )
-        lines = [
-            (
-                f"{item['ingredient__name']} "
-                f"({item['ingredient__measurement_unit']}) — "
-                f"{item['total']}"
+        fmt = request.query_params.get("format", shopping_list.DEFAULT_FORMAT)
+        if fmt not in shopping_list.FORMATS:
+            raise ValidationError(
+                {
+                    "format": [
+                        "Допустимые форматы: "
+                        + ", ".join(shopping_list.FORMATS)
+                    ]
+                }
             )
-            for item in qs
-        ]
-        content = "\n".join(lines)
-        response = HttpResponse(content, content_type="text/plain")
+        content_type, extension, writer = shopping_list.FORMATS[fmt]
+        # итоги уже посчитаны в ShoppingListItem — один индексный запрос
+        items = shopping_totals.shopping_list(request.user).iterator(
+            chunk_size=SHOPPING_LIST_CHUNK_SIZE
+        )
+        response = StreamingHttpResponse(
+            writer(items), content_type=content_type
+        )
         response["Content-Disposition"] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="shopping_list.{extension}"'
         )
         return response
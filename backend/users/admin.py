@@ -6,6 +6,14 @@ from .models import User
 
 @admin.register(User)
 class UserAdmin(DjangoUserAdmin):
-    list_display = ("id", "email", "username", "first_name", "last_name")
+    list_display = (
+        "id",
+        "email",
+        "username",
+        "first_name",
+        "last_name",
+        "recipes_count",
+        "followers_count",
+    )
     search_fields = ("email", "username")
     ordering = ("id",)
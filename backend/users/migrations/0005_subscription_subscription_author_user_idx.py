@@ -0,0 +1,19 @@
+# Generated by Django 4.2.11 on 2026-10-18 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_alter_user_email"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(
+                fields=["author", "user"], name="subscription_author_user_idx"
+            ),
+        ),
+    ]
@@ -37,6 +37,16 @@ class User(AbstractUser):
         blank=True,
         null=True,
     )
+    # уменьшенные копии аватара, см. recipes/images.py
+    avatar_variants = models.JSONField(
+        "Размеры аватара", default=dict, blank=True, editable=False
+    )
+    recipes_count = models.PositiveIntegerField(
+        "Рецептов", default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        "Подписчиков", default=0, editable=False
+    )
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ("username", "first_name", "last_name")
@@ -73,6 +83,12 @@ class Subscription(models.Model):
                 check=~Q(user=F("author")), name="prevent_self_subscription"
             ),
         ]
+        indexes = [
+            # подписчики автора: счётчики и проверки is_subscribed
+            models.Index(
+                fields=["author", "user"], name="subscription_author_user_idx"
+            ),
+        ]
         verbose_name = "подписка"
         verbose_name_plural = "подписки"
 
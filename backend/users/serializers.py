@@ -1,6 +1,7 @@
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from drf_extra_fields.fields import Base64ImageField
-from recipes.models import Recipe
+from recipes import images, timeline
 from recipes.serializers import RecipeShortSerializer
 from rest_framework import serializers
 from .models import Subscription, User
@@ -16,6 +17,7 @@ class AvatarSerializer(serializers.ModelSerializer):
 
 class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
+    avatar_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -26,11 +28,25 @@ class UserSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
             "avatar",
+            "avatar_variants",
             "is_subscribed",
+            "recipes_count",
+            "followers_count",
+        )
+        read_only_fields = (
+            "id",
+            "avatar",
+            "avatar_variants",
+            "is_subscribed",
+            "recipes_count",
+            "followers_count",
         )
-        read_only_fields = ("id", "avatar", "is_subscribed")
 
     def get_is_subscribed(self, obj):
+        # аннотация из queryset (UserViewSet / RecipeQuerySet.with_user_flags)
+        annotated = getattr(obj, "is_subscribed", None)
+        if annotated is not None:
+            return annotated
         request = self.context.get("request")
         if not request or request.user.is_anonymous:
             return False
@@ -38,6 +54,21 @@ class UserSerializer(serializers.ModelSerializer):
             user=request.user, author=obj
         ).exists()
 
+    def get_avatar_variants(self, obj):
+        request = self.context.get("request")
+        return images.variant_urls(
+            obj.avatar,
+            obj.avatar_variants,
+            request.build_absolute_uri if request else str,
+        )
+
+    def to_representation(self, instance):
+        rep = super().to_representation(instance)
+        # карта размеров — только по ?variants=1
+        if not images.wants_variants(self.context):
+            rep.pop("avatar_variants")
+        return rep
+
 
 class SubscriptionSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source="author.id")
@@ -75,7 +106,8 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         Можно ограничить через ?recipes_limit=N.
         """
         request = self.context.get("request")
-        qs = Recipe.objects.filter(author=obj.author).order_by("-pub_date")
+        # при наличии prefetch из UserViewSet.subscriptions запросов нет
+        qs = obj.author.recipes.all()
         limit = request.query_params.get("recipes_limit") if request else None
         if limit is not None:
             try:
@@ -85,7 +117,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return RecipeShortSerializer(qs, many=True, context=self.context).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.author.recipes_count
 
 
 class SubscriptionCreateSerializer(serializers.Serializer):
@@ -99,10 +131,13 @@ class SubscriptionCreateSerializer(serializers.Serializer):
             raise serializers.ValidationError("Вы уже подписаны")
         return value
 
+    @transaction.atomic
     def create(self, validated_data):
         user = self.context["request"].user
         author = get_object_or_404(User, pk=validated_data["author_id"])
-        return Subscription.objects.create(user=user, author=author)
+        subscription = Subscription.objects.create(user=user, author=author)
+        timeline.backfill(user.id, author)
+        return subscription
 
 
 class SubscriptionDeleteSerializer(serializers.Serializer):
@@ -116,8 +151,10 @@ class SubscriptionDeleteSerializer(serializers.Serializer):
             raise serializers.ValidationError("Вы не были подписаны")
         return value
 
+    @transaction.atomic
     def save(self, **kwargs):
         user = self.context["request"].user
         Subscription.objects.filter(
             user=user, author_id=self.validated_data["author_id"]
         ).delete()
+        timeline.prune(user.id, self.validated_data["author_id"])
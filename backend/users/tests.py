@@ -1 +1,113 @@
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Recipe
+from rest_framework.test import APIClient
+
+from .models import Subscription, User
+
+
+def create_recipes(author, count):
+    return Recipe.objects.bulk_create(
+        Recipe(
+            author=author,
+            name=f"рецепт {number}",
+            image="recipes/seed.png",
+            text="текст",
+            cooking_time=10,
+        )
+        for number in range(count)
+    )
+
+
+class SubscriptionsQueryTests(TestCase):
+    """Число запросов /api/users/subscriptions/ не зависит от объёма."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email="reader@example.com", username="reader"
+        )
+        for number in range(6):
+            author = User.objects.create(
+                email=f"author{number}@example.com",
+                username=f"author{number}",
+            )
+            create_recipes(author, 6)
+            Subscription.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/users/subscriptions/", params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_image_variants_are_not_deferred(self):
+        # COUNT, подписки с авторами, рецепты авторов
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                "/api/users/subscriptions/", {"variants": "1"}
+            )
+        recipes = response.json()["results"][0]["recipes"]
+        self.assertEqual(len(recipes), 6)
+        self.assertTrue(all("image_variants" in recipe for recipe in recipes))
+
+    def test_image_variants_only_on_request(self):
+        _, data = self.count_queries()
+        for author in data["results"]:
+            for recipe in author["recipes"]:
+                self.assertNotIn("image_variants", recipe)
+
+    def test_flat_in_page_size_and_recipes_limit(self):
+        counts = set()
+        for limit, recipes_limit in ((1, 1), (3, 3), (6, 6), (6, None)):
+            params = {"limit": limit}
+            if recipes_limit is not None:
+                params["recipes_limit"] = recipes_limit
+            queries, data = self.count_queries(**params)
+            counts.add(queries)
+            self.assertEqual(len(data["results"]), limit)
+            self.assertEqual(
+                {len(author["recipes"]) for author in data["results"]},
+                {recipes_limit or 6},
+            )
+        self.assertEqual(counts, {3})
+
+
+class FollowersCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email="author@example.com", username="author"
+        )
+        cls.readers = [
+            User.objects.create(
+                email=f"reader{number}@example.com",
+                username=f"reader{number}",
+            )
+            for number in range(3)
+        ]
+
+    def subscribe(self, reader, method="post"):
+        client = APIClient()
+        client.force_authenticate(reader)
+        url = f"/api/users/{self.author.id}/subscribe/"
+        return getattr(client, method)(url).status_code
+
+    def followers_count(self):
+        self.author.refresh_from_db()
+        return self.author.followers_count
+
+    def test_subscribe_and_unsubscribe(self):
+        for reader in self.readers:
+            self.assertEqual(self.subscribe(reader), 201)
+        self.assertEqual(self.subscribe(self.readers[0]), 400)
+        self.assertEqual(self.followers_count(), 3)
+
+        self.assertEqual(self.subscribe(self.readers[0], "delete"), 204)
+        self.assertEqual(self.subscribe(self.readers[0], "delete"), 400)
+        self.assertEqual(self.followers_count(), 2)
@@ -1,5 +1,16 @@
+from django.db.models import (
+    BooleanField,
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Value,
+    Window,
+)
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet as DjoserUserViewSet
+from recipes.models import Recipe
 from recipes.pagination import LimitPageNumberPagination
 from rest_framework import status
 from rest_framework.decorators import action
@@ -37,6 +48,19 @@ class UserViewSet(DjoserUserViewSet):
             return [AllowAny()]
         return [IsAuthenticated()]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return queryset.annotate(
+            is_subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef("pk"))
+            )
+        )
+
     @action(detail=True, methods=("post", "delete"), url_path="subscribe")
     def subscribe(self, request, id=None):
         # Сначала убеждаемся, что автор существует
@@ -61,9 +85,40 @@ class UserViewSet(DjoserUserViewSet):
         serializer.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def subscriptions_queryset(user, recipes_limit=None):
+        """
+        Подписки user с авторами (и их счётчиком рецептов) одним запросом
+        и не более recipes_limit свежих рецептов на автора вторым:
+        ROW_NUMBER() OVER (PARTITION BY author ...) <= recipes_limit.
+        """
+        recipes = Recipe.objects.only(
+            "id", "name", "image", "image_variants", "cooking_time", "author"
+        )
+        if recipes_limit is not None:
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F("author"),
+                    order_by=(F("pub_date").desc(), F("id").desc()),
+                )
+            ).filter(row_number__lte=recipes_limit)
+        return (
+            Subscription.objects.filter(user=user)
+            .select_related("author")
+            .prefetch_related(Prefetch("author__recipes", queryset=recipes))
+            .order_by("id")
+        )
+
     @action(detail=False, methods=("get",), url_path="subscriptions")
     def subscriptions(self, request):
-        qs = Subscription.objects.filter(user=request.user)
+        try:
+            recipes_limit = int(request.query_params["recipes_limit"])
+        except (KeyError, ValueError):
+            recipes_limit = None
+        if recipes_limit is not None and recipes_limit < 0:
+            recipes_limit = None
+        qs = self.subscriptions_queryset(request.user, recipes_limit)
         page = self.paginate_queryset(qs)
         serializer = SubscriptionSerializer(
             page or qs, many=True, context={"request": request}
@@ -84,8 +139,8 @@ class UserViewSet(DjoserUserViewSet):
                 status=status.HTTP_200_OK,
             )
 
-        # DELETE
-        user.avatar.delete(save=False)
+        # DELETE: файл по хэшу могут делить другие — его не удаляем;
+        # файлы без ссылок убирает manage.py rehash_media --gc
         user.avatar = None
         user.save(update_fields=["avatar"])
         return Response(status=status.HTTP_204_NO_CONTENT)